@@ -0,0 +1,88 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .metrics import record_cache
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def bump_user_version(user_id):
+    cache.set(user_version_key(user_id), time.time_ns(), None)
+
+
+class TokenCache:
+    """Ограниченный LRU-кэш токенов внутри процесса.
+
+    Запись живёт не дольше ttl и сверяется с версией пользователя в кэше
+    Django, которую сигналы меняют при выходе, смене пароля и деактивации.
+    Выход сразу действует во всех процессах, которые видят этот кэш, -
+    при нескольких контейнерах он должен быть общим (см. CACHES).
+    Наружу отдаются глубокие копии, чтобы запросы не делили объекты.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, token, version, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        if cache.get(user_version_key(user.pk)) != version:
+            return None
+        return copy.deepcopy((user, token))
+
+    def get_version(self, user_id):
+        version = cache.get(user_version_key(user_id))
+        if version is None:
+            cache.add(user_version_key(user_id), time.time_ns(), None)
+            version = cache.get(user_version_key(user_id))
+        return version
+
+    def set(self, key, user, token, version):
+        """Запоминает токен с версией, прочитанной до запроса к БД."""
+        user, token = copy.deepcopy((user, token))
+        with self.lock:
+            self.entries[key] = (
+                user, token, version, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        record_cache('token', cached is not None)
+        if cached is not None:
+            return cached
+        # Версия читается до загрузки токена: если выход случится между
+        # ними, в кэш попадёт уже устаревшая версия и запись не сработает.
+        user_id = self.get_model().objects.filter(
+            key=key).values_list('user_id', flat=True).first()
+        version = None if user_id is None else token_cache.get_version(
+            user_id)
+        user, token = super().authenticate_credentials(key)
+        if user.pk == user_id:
+            token_cache.set(key, user, token, version)
+        return user, token
@@ -0,0 +1,47 @@
+from django.db import connections, router
+
+
+def insert_missing(model, user, field_name, ids):
+    """Связывает user с объектами ids одним INSERT ... SELECT.
+
+    Несуществующие id отсекает SELECT по таблице объектов, уже
+    существующие пары - ON CONFLICT DO NOTHING по уникальному
+    ограничению. RETURNING отдаёт id, вставленные именно этим запросом,
+    поэтому ответ верен и при параллельных запросах. Нужен PostgreSQL
+    или SQLite 3.35+.
+    """
+    ids = sorted(ids)
+    if not ids:
+        return set()
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    user_field = opts.get_field('user')
+    target = opts.get_field(field_name)
+    # Django выставляет значения по умолчанию сам, в сыром INSERT их
+    # нужно передать явно.
+    defaults = [
+        field for field in opts.concrete_fields
+        if not field.primary_key and field not in (user_field, target)
+    ]
+    columns = ', '.join(
+        quote(field.column) for field in (user_field, target, *defaults))
+    values = ', '.join(['%s', f'source.{quote(target.target_field.column)}']
+                       + ['%s'] * len(defaults))
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+        f'SELECT {values} '
+        f'FROM {quote(target.related_model._meta.db_table)} source '
+        f'WHERE source.{quote(target.target_field.column)} '
+        f'IN ({", ".join(["%s"] * len(ids))}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(target.column)}'
+    )
+    params = [
+        user.pk,
+        *(field.get_db_prep_save(field.get_default(), connection)
+          for field in defaults),
+        *ids,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
@@ -0,0 +1,103 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from .compression import compress_variants
+from .metrics import record_cache
+
+GENERATION_KEY = 'recipes:generation'
+# Меняется вместе с форматом значения: иначе после выкладки новый код
+# прочитал бы записи, сохранённые старыми воркерами.
+RESPONSE_CACHE_VERSION = 2
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    # Не incr: файловый и локальный кэши перезаписывают ключ со сроком
+    # по умолчанию, и поколение истекало бы само.
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует готовые JSON-ответы для анонимных GET-запросов.
+
+    Ключ строится из поколения данных о рецептах и нормализованных
+    параметров запроса, поэтому любая запись в рецепты, теги или
+    ингредиенты делает все сохранённые ответы недоступными. Тела
+    хранятся вместе со сжатыми вариантами для CompressionMiddleware.
+    """
+    response_cache_actions = ('list', 'retrieve')
+    response_cache_params = ()
+
+    def is_response_cacheable(self, request):
+        return (
+            request.method == 'GET'
+            and self.action in self.response_cache_actions
+            and request.user.is_anonymous
+            and request.accepted_renderer.format == 'json'
+        )
+
+    def get_response_cache_key(self, request):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        params = [
+            (name, sorted(set(request.query_params.getlist(name))))
+            for name in self.response_cache_params
+        ]
+        raw = repr((
+            self.basename, self.action, self.kwargs.get(lookup),
+            request.scheme, request.get_host(), params,
+        ))
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return (f'response:v{RESPONSE_CACHE_VERSION}:'
+                f'{get_generation()}:{digest}')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        self.response_cache_key = None
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        record_cache('response', cached is not None)
+        if cached is not None:
+            content_type, variants = cached
+            response = HttpResponse(
+                variants['identity'], content_type=content_type)
+            response.compressed_variants = variants
+            return response
+        self.response_cache_key = key
+        return handler(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if (key and isinstance(response, Response)
+                and response.status_code == 200):
+            response.render()
+            variants = compress_variants(response.content)
+            cache.set(
+                key,
+                (response['Content-Type'], variants),
+                settings.RESPONSE_CACHE_TIMEOUT,
+            )
+            response.compressed_variants = variants
+        return response
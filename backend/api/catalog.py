@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils.http import parse_etags
+
+from recipes.models import Ingredient, IngredientChange
+from .compression import compress_variants
+from .metrics import record_cache
+from .renderers import FastJSONRenderer
+
+
+# Ключ рекомендательной блокировки PostgreSQL для записи журнала.
+CATALOG_LOCK_ID = 0x666f6f64
+CATALOG_CACHE_TIMEOUT = 3600
+
+
+def log_ingredient_change(ingredient, deleted=False):
+    """Пишет изменение в журнал справочника.
+
+    Версия справочника - наибольший id журнала, поэтому id должны
+    становиться видимыми по порядку: иначе клиент, получивший версию N,
+    пока запись с меньшим id ещё не закоммичена, пропустит её навсегда.
+    Блокировка держится до конца транзакции, так что следующий писатель
+    получает id только после коммита предыдущего. SQLite и так пишет
+    по одной транзакции за раз.
+    """
+    using = router.db_for_write(IngredientChange)
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s)', [CATALOG_LOCK_ID])
+        IngredientChange.objects.using(using).create(
+            ingredient_id=ingredient.id,
+            name=ingredient.name,
+            measurement_unit=ingredient.measurement_unit,
+            deleted=deleted,
+        )
+
+
+def get_catalog_version():
+    return IngredientChange.objects.aggregate(
+        version=Max('id'))['version'] or 0
+
+
+def etag_matches(etag, header):
+    """Слабое сравнение ETag со списком из If-None-Match."""
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return any(
+        tag.removeprefix('W/') == etag.removeprefix('W/') for tag in etags)
+
+
+def build_columns(rows):
+    """Колонки ids/names и словарь единиц: units хранит каждую единицу
+    один раз, unit_index - её номер для каждой строки."""
+    ids, names, unit_index, units = [], [], [], {}
+    for ingredient_id, name, measurement_unit in rows:
+        ids.append(ingredient_id)
+        names.append(name)
+        unit_index.append(units.setdefault(measurement_unit, len(units)))
+    return {
+        'ids': ids,
+        'names': names,
+        'units': list(units),
+        'unit_index': unit_index,
+    }
+
+
+def build_catalog(version, since=None):
+    """Полный справочник или изменения после версии since.
+
+    Если изменений больше, чем ингредиентов, дешевле отдать полный
+    справочник; клиент отличает его по full=True.
+    """
+    if since is None or version - since > Ingredient.objects.count():
+        rows = Ingredient.objects.order_by('id').values_list(
+            'id', 'name', 'measurement_unit')
+        return {'version': version, 'full': True,
+                **build_columns(rows), 'deleted': []}
+    latest = {}
+    for ingredient_id, name, measurement_unit, deleted in (
+            IngredientChange.objects.filter(
+                id__gt=since, id__lte=version
+            ).values_list(
+                'ingredient_id', 'name', 'measurement_unit', 'deleted')):
+        latest[ingredient_id] = (name, measurement_unit, deleted)
+    rows = sorted(
+        (ingredient_id, name, measurement_unit)
+        for ingredient_id, (name, measurement_unit, deleted) in latest.items()
+        if not deleted
+    )
+    return {
+        'version': version,
+        'full': False,
+        **build_columns(rows),
+        'deleted': sorted(
+            ingredient_id
+            for ingredient_id, (_, _, deleted) in latest.items() if deleted
+        ),
+    }
+
+
+def get_catalog_payloads(version, since=None):
+    """Готовые тела ответа по кодированиям.
+
+    Тела кэшируются уже сжатыми с ключом по версии, поэтому после
+    изменения справочника старые записи просто перестают читаться и
+    вытесняются по таймауту.
+    """
+    key = f'ingredients:catalog:{since}:{version}'
+    payloads = cache.get(key)
+    record_cache('catalog', payloads is not None)
+    if payloads is None:
+        payloads = compress_variants(
+            FastJSONRenderer().render(build_catalog(version, since)))
+        cache.set(key, payloads, CATALOG_CACHE_TIMEOUT)
+    return payloads
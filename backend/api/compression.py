@@ -0,0 +1,116 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSORS = {
+    'gzip': lambda content, best: gzip.compress(
+        content, compresslevel=9 if best else 6, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda content, best: brotli.compress(
+        content, quality=9 if best else 4)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda content, best: zstandard.ZstdCompressor(
+        level=12 if best else 3).compress(content)
+
+PREFERENCE = ('br', 'zstd', 'gzip')
+
+strong_etag = _lazy_re_compile(r'^(?!W/)"')
+
+
+def compress_variants(content):
+    """Несжатое тело и все доступные сжатые варианты для кэша.
+
+    Сжимается один раз на максимальном разумном уровне; варианты,
+    которые не меньше исходного тела, не сохраняются.
+    """
+    variants = {'identity': content}
+    for encoding, compress in COMPRESSORS.items():
+        compressed = compress(content, True)
+        if len(compressed) < len(content):
+            variants[encoding] = compressed
+    return variants
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(request, available):
+    """Лучшее из available кодирование, которое принимает клиент."""
+    accepted = parse_accept_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding in PREFERENCE:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if encoding in available and quality > 0:
+            return encoding
+    return 'identity'
+
+
+class CompressionMiddleware:
+    """Сжимает ответы API подходящих типов и размеров.
+
+    Если у ответа есть compressed_variants (тела из кэша), берётся
+    готовый вариант без повторного сжатия. Потоковые ответы, ответы с
+    Content-Encoding и маленькие тела пропускаются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        variants = getattr(response, 'compressed_variants', None)
+        if (response.streaming or response.has_header('Content-Encoding')
+                or response.status_code != 200):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if variants is None:
+            encoding = choose_encoding(request, COMPRESSORS)
+            if encoding == 'identity':
+                return response
+            content = COMPRESSORS[encoding](response.content, False)
+            if len(content) >= len(response.content):
+                return response
+        else:
+            encoding = choose_encoding(request, variants)
+            if encoding == 'identity':
+                return response
+            content = variants[encoding]
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and strong_etag.match(etag):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,100 @@
+import posixpath
+import time
+import zipfile
+
+from recipes.models import Recipe
+from .payloads import get_recipe_bodies
+from .renderers import FastJSONRenderer
+
+EXPORT_BATCH_SIZE = 200
+EXPORT_READ_SIZE = 64 * 1024
+
+
+class StreamBuffer:
+    """Приёмник для ZipFile без seek и tell.
+
+    ZipFile пишет в него заголовки с дескрипторами данных, а генератор
+    забирает накопленные байты после каждой порции.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def get_archive_image_name(recipe_id, image):
+    # У разных рецептов могут быть файлы с одинаковым именем.
+    return f'images/{recipe_id}-{posixpath.basename(image)}'
+
+
+def iter_batches(queryset, size=EXPORT_BATCH_SIZE):
+    batch = []
+    for item in queryset.iterator(chunk_size=size):
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_recipe_archive(buffer, author):
+    """Пишет ZIP с рецептами автора в buffer, уступая управление после
+    каждой порции рецептов и каждого блока картинки.
+
+    recipes.ndjson содержит по рецепту на строку в формате API, картинки
+    лежат в images/ с id рецепта в имени.
+    """
+    recipes = Recipe.objects.filter(author=author).order_by('id')
+    renderer = FastJSONRenderer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('recipes.ndjson', 'w') as ndjson:
+            # Заголовок архива уходит клиенту до чтения первой порции.
+            yield
+            for batch in iter_batches(recipes.only('id', 'snapshot')):
+                for body in get_recipe_bodies(batch):
+                    if body['image']:
+                        body['image'] = get_archive_image_name(
+                            body['id'], body['image'])
+                    ndjson.write(renderer.render(body) + b'\n')
+                yield
+        storage = Recipe._meta.get_field('image').storage
+        images = recipes.exclude(image='').values_list('id', 'image')
+        for recipe_id, image in images.iterator(
+                chunk_size=EXPORT_BATCH_SIZE):
+            try:
+                source = storage.open(image, 'rb')
+            except OSError:
+                continue
+            info = zipfile.ZipInfo(
+                get_archive_image_name(recipe_id, image),
+                time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w') as target:
+                for chunk in iter(
+                        lambda: source.read(EXPORT_READ_SIZE), b''):
+                    target.write(chunk)
+                    yield
+
+
+def iter_recipe_archive(author):
+    """Отдаёт ZIP по мере записи: в памяти держится одна порция рецептов
+    и один блок файла, поэтому потребление не зависит от числа рецептов.
+    """
+    buffer = StreamBuffer()
+    for _ in write_recipe_archive(buffer, author):
+        data = buffer.pop()
+        if data:
+            yield data
+    yield buffer.pop()
@@ -0,0 +1,83 @@
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.relations import (MANY_RELATION_KWARGS, ManyRelatedField,
+                                      PrimaryKeyRelatedField)
+from rest_framework.serializers import ListSerializer
+
+from .metrics import IMAGE_PROCESSING
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который берёт объекты из словаря,
+    загруженного одним IN-запросом на все значения поля.
+
+    Значения, которых нет в словаре, проверяются обычным путём, поэтому
+    ошибки остаются прежними.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.resolved = {}
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def resolve(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, ValidationError):
+                continue
+        self.resolved = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        try:
+            return self.resolved[self.to_pk(data)]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            return super().to_internal_value(data)
+
+
+class BulkManyRelatedField(ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, (list, tuple)):
+            self.child_relation.resolve(data)
+        return super().to_internal_value(data)
+
+
+class BulkResolveListSerializer(ListSerializer):
+    """Заранее загружает объекты для BulkPrimaryKeyRelatedField
+    во вложенных элементах списка."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for name, field in self.child.fields.items():
+                if isinstance(field, BulkPrimaryKeyRelatedField):
+                    field.resolve(
+                        item.get(name)
+                        for item in data if isinstance(item, Mapping)
+                    )
+        return super().to_internal_value(data)
+
+
+class Base64ImageField(Base64ImageField):
+    """Base64ImageField с замером времени разбора картинки."""
+
+    def to_internal_value(self, data):
+        with IMAGE_PROCESSING.labels('decode').time():
+            return super().to_internal_value(data)
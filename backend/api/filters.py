@@ -1,14 +1,30 @@
+from django.conf import settings
+from django.core.cache import cache
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe, Tag
+from .cache import get_generation
+from .metrics import record_cache
+
+
+def get_tag_slug_choices():
+    key = f'tags:slugs:{get_generation()}'
+    choices = cache.get(key)
+    record_cache('tag_slugs', choices is not None)
+    if choices is None:
+        choices = [
+            (slug, slug)
+            for slug in Tag.objects.values_list('slug', flat=True)
+        ]
+        cache.set(key, choices, settings.RESPONSE_CACHE_TIMEOUT)
+    return choices
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+        choices=get_tag_slug_choices,
     )
 
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
@@ -29,7 +45,7 @@ class RecipeFilter(FilterSet):
         user = self.request.user
         if value and user.is_authenticated:
             return queryset.filter(shopping_list__user=self.request.user)
-        return
+        return queryset
 
 
 class IngredientFilter(SearchFilter):
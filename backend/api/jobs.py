@@ -0,0 +1,23 @@
+from io import StringIO
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from jobs.registry import register
+from .shopping_list import build_shopping_list
+
+
+@register('shopping_list')
+def shopping_list(job):
+    content = build_shopping_list(job.user)
+    job.result_file.save(
+        f'{uuid4().hex}.txt', ContentFile(content.encode()), save=False)
+    return {'items': len(content.splitlines())}
+
+
+@register('repair_snapshots')
+def repair_snapshots(job):
+    output = StringIO()
+    call_command('check_recipe_snapshots', fix=True, stdout=output)
+    return {'output': output.getvalue()}
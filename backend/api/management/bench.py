@@ -0,0 +1,17 @@
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(func, number):
+    """Результат func, среднее время вызова и число запросов к БД.
+
+    Первый вызов только считает запросы и прогревает кэши.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    start = time.perf_counter()
+    for _ in range(number):
+        result = func()
+    return result, (time.perf_counter() - start) / number, len(queries)
@@ -0,0 +1,131 @@
+import re
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from api.filters import RecipeFilter
+from api.management.seed import seed_recipes
+from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCart)
+
+User = get_user_model()
+
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(.*)')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для типовых запросов API на синтетических '
+            'данных и показывает последовательные сканирования')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--allow-seqscan', action='store_true',
+            help='Не запрещать планировщику PostgreSQL seq scan: '
+                 'показывает план, который он выберет сам.')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Печатать планы целиком.')
+
+    def get_queries(self, user, page_size=6):
+        request = SimpleNamespace(user=user)
+        recipes = Recipe.objects.all()
+        recipe_ids = list(recipes.values_list('id', flat=True)[:page_size])
+        author = Recipe.objects.values_list('author', flat=True).first()
+        slug = Recipe.tags.through.objects.values_list(
+            'tag__slug', flat=True).first()
+
+        def filtered(**params):
+            return RecipeFilter(
+                params, queryset=recipes, request=request).qs[:page_size]
+
+        shopping_cart = IngredientRecipe.objects.filter(
+            recipe__shopping_list__user=user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
+
+        return {
+            'GET /api/recipes/': recipes[:page_size],
+            'GET /api/recipes/?tags=': filtered(tags=[slug]),
+            'GET /api/recipes/?author=': filtered(author=author),
+            'GET /api/recipes/?is_favorited=1': filtered(is_favorited=True),
+            'GET /api/recipes/?is_in_shopping_cart=1': filtered(
+                is_in_shopping_cart=True),
+            'снимки: ингредиенты страницы': IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('recipe_id', 'ingredient_id', 'amount'),
+            'снимки: избранное пользователя': Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True),
+            'снимки: корзина пользователя': ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True),
+            'GET /api/users/subscriptions/': User.objects.filter(
+                following__user=user
+            ).annotate(
+                recipes_count=Count('recipes')
+            ).order_by('username')[:page_size],
+            'подписки: рецепты автора': Recipe.objects.filter(
+                author=author).only('id', 'name', 'image', 'cooking_time')[:3],
+            'GET /api/recipes/download_shopping_cart/': shopping_cart,
+            'GET /api/ingredients/?name=': Ingredient.objects.filter(
+                name__istartswith='seed'),
+        }
+
+    def seed(self, count):
+        recipes = seed_recipes(count)
+        user = recipes[0].author
+        sample = recipes[::max(len(recipes) // 50, 1)]
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe) for recipe in sample)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in sample)
+        Follow.objects.bulk_create(
+            Follow(user=user, author_id=author_id)
+            for author_id in {recipe.author_id for recipe in sample}
+            if author_id != user.id
+        )
+        return user
+
+    def find_scans(self, plan):
+        if connection.vendor == 'postgresql':
+            return POSTGRES_SEQ_SCAN.findall(plan)
+        return [
+            table for table, rest in SQLITE_SCAN.findall(plan)
+            if 'INDEX' not in rest
+        ]
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True)
+        return queryset.explain()
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(options['recipes'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                    if not options['allow_seqscan']:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+            found = 0
+            for name, queryset in self.get_queries(user).items():
+                plan = self.explain(queryset)
+                scans = self.find_scans(plan)
+                found += bool(scans)
+                if scans:
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: последовательное сканирование '
+                        f'{", ".join(sorted(set(scans)))}'))
+                else:
+                    self.stdout.write(f'{name}: ok')
+                if options['plans']:
+                    self.stdout.write(plan + '\n')
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'Запросов с последовательным сканированием: {found}')
@@ -0,0 +1,88 @@
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import SerializerMethodField
+
+from api.management.bench import measure
+from api.management.seed import seed_recipes
+from api.payloads import get_recipe_bodies
+from api.serializers import RecipeBodySerializer
+from recipes.models import Recipe
+from recipes.snapshots import build_recipe_bodies
+
+
+class ReferenceRecipeSerializer(RecipeBodySerializer):
+    """Прежняя сборка рецепта: флаги пользователя - запросом на рецепт.
+
+    Оставлена только как эталон для сравнения, в API не подключать.
+    """
+    is_favorited = SerializerMethodField(read_only=True)
+    is_in_shopping_cart = SerializerMethodField(read_only=True)
+
+    def get_is_favorited(self, obj):
+        request = self.context.get('request')
+        if not request or request.user.is_anonymous:
+            return False
+        return obj.in_favorite.filter(user=request.user).exists()
+
+    def get_is_in_shopping_cart(self, obj):
+        request = self.context.get('request')
+        if not request or request.user.is_anonymous:
+            return False
+        return obj.shopping_list.filter(user=request.user).exists()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает эталонный сериализатор рецептов с плоской сборкой '
+            'build_recipe_bodies на странице рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--number', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        with transaction.atomic():
+            missing = page_size - Recipe.objects.count()
+            if missing > 0:
+                seed_recipes(missing)
+
+            def serializer_path():
+                recipes = list(Recipe.objects.all()[:page_size])
+                prefetch_related_objects(
+                    recipes, 'author', 'tags',
+                    'ingredienttorecipe__ingredient')
+                return ReferenceRecipeSerializer(recipes, many=True).data
+
+            def flat_path():
+                recipe_ids = list(
+                    Recipe.objects.values_list('id', flat=True)[:page_size])
+                bodies = build_recipe_bodies(recipe_ids)
+                return [bodies[recipe_id] for recipe_id in recipe_ids]
+
+            def snapshot_path():
+                return get_recipe_bodies(
+                    list(Recipe.objects.all()[:page_size]))
+
+            renderer = JSONRenderer()
+            drf, drf_time, drf_queries = measure(
+                serializer_path, options['number'])
+            flat, flat_time, flat_queries = measure(
+                flat_path, options['number'])
+            get_recipe_bodies(list(Recipe.objects.all()[:page_size]))
+            snapshot, snapshot_time, snapshot_queries = measure(
+                snapshot_path, options['number'])
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'{page_size} рецептов, совпадает: '
+            f'{renderer.render(drf) == renderer.render(flat)}, '
+            f'снимки: {renderer.render(drf) == renderer.render(snapshot)}\n'
+            f'  сериализатор:         {drf_time * 1000:.2f} мс, '
+            f'{drf_queries} запросов\n'
+            f'  build_recipe_bodies:  {flat_time * 1000:.2f} мс, '
+            f'{flat_queries} запросов (x{drf_time / flat_time:.1f})\n'
+            f'  Recipe.snapshot:      {snapshot_time * 1000:.2f} мс, '
+            f'{snapshot_queries} запросов (x{drf_time / snapshot_time:.1f})'
+        )
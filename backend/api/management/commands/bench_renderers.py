@@ -0,0 +1,94 @@
+import datetime
+import decimal
+import io
+import json
+import timeit
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.management.seed import seed_recipes
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import IngredientSerializer, RecipeReadSerializer
+from recipes.models import Ingredient, Recipe
+
+INGREDIENTS_FILE = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает JSONRenderer/JSONParser DRF с FastJSONRenderer/Parser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument(
+            '--ingredients-file', default=str(INGREDIENTS_FILE))
+
+    def get_payloads(self, options):
+        ingredients = Ingredient.objects.all()
+        if ingredients.exists():
+            catalog = IngredientSerializer(ingredients, many=True).data
+        else:
+            with open(options['ingredients_file'], encoding='utf-8') as f:
+                catalog = [
+                    dict(item, id=i)
+                    for i, item in enumerate(json.load(f), start=1)
+                ]
+        missing = options['recipes'] - Recipe.objects.count()
+        if missing > 0:
+            seed_recipes(missing)
+        recipes = Recipe.objects.all()[:options['recipes']]
+        yield 'ingredients', catalog
+        yield 'recipes', {
+            'count': len(recipes),
+            'next': None,
+            'previous': None,
+            'results': RecipeReadSerializer(recipes, many=True).data,
+        }
+        yield 'types', [
+            {
+                'decimal': decimal.Decimal('1.10'),
+                'datetime': datetime.datetime.now(datetime.timezone.utc),
+                'date': datetime.date.today(),
+                'uuid': uuid.uuid4(),
+                'text': 'строка\u2028',
+            }
+            for _ in range(1000)
+        ]
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write('orjson не установлен, сравнивать не с чем')
+        number = options['number']
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        # Недостающие рецепты создаются для замера и откатываются.
+        with transaction.atomic():
+            payloads = list(self.get_payloads(options))
+            transaction.set_rollback(True)
+        for name, payload in payloads:
+            content = stdlib.render(payload)
+            same = fast.render(payload) == content
+            render_std = timeit.timeit(
+                lambda: stdlib.render(payload), number=number)
+            render_fast = timeit.timeit(
+                lambda: fast.render(payload), number=number)
+            parse_std = timeit.timeit(
+                lambda: JSONParser().parse(io.BytesIO(content)),
+                number=number)
+            parse_fast = timeit.timeit(
+                lambda: FastJSONParser().parse(io.BytesIO(content)),
+                number=number)
+            self.stdout.write(
+                f'{name}: {len(content)} байт, совпадает: {same}\n'
+                f'  render {render_std / number * 1000:.3f} мс -> '
+                f'{render_fast / number * 1000:.3f} мс '
+                f'(x{render_std / render_fast:.1f})\n'
+                f'  parse  {parse_std / number * 1000:.3f} мс -> '
+                f'{parse_fast / number * 1000:.3f} мс '
+                f'(x{parse_std / parse_fast:.1f})'
+            )
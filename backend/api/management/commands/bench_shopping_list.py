@@ -0,0 +1,44 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.management.bench import measure
+from api.management.seed import seed_recipes
+from api.shopping_list import (aggregate_ingredients, build_shopping_list,
+                               get_cart_rows)
+from recipes.models import ShoppingCart
+
+
+class Command(BaseCommand):
+    help = 'Измеряет сборку списка покупок на большой корзине'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--number', type=int, default=20)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        with transaction.atomic():
+            recipes = seed_recipes(options['recipes'])
+            user = recipes[0].author
+            rnd = random.Random(0)
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe=recipe,
+                             servings=rnd.randint(1, 4))
+                for recipe in recipes
+            )
+            rows, query_time, queries = measure(
+                lambda: get_cart_rows(user), number)
+            lines, aggregate_time, _ = measure(
+                lambda: aggregate_ingredients(rows), number)
+            _, total_time, _ = measure(
+                lambda: build_shopping_list(user), number)
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'{options["recipes"]} рецептов в корзине, {len(rows)} групп '
+            f'из БД, {len(lines)} строк в списке\n'
+            f'  запрос:      {query_time * 1000:.2f} мс, {queries} запросов\n'
+            f'  нормализация: {aggregate_time * 1000:.2f} мс\n'
+            f'  всего:       {total_time * 1000:.2f} мс'
+        )
@@ -0,0 +1,107 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Выполняется в отдельном интерпретаторе: загружает приложение так же,
+# как мастер gunicorn с preload_app, и форкается как воркер.
+PROBE = '''
+import gc, json, os, sys, time
+
+def read_memory(path, fields):
+    try:
+        with open(path) as source:
+            lines = source.read().splitlines()
+    except OSError:
+        return None
+    return sum(
+        int(line.split()[1]) for line in lines
+        if line.split(':')[0] in fields
+    ) * 1024
+
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+result = {
+    'load': time.perf_counter() - start,
+    'rss': read_memory('/proc/self/status', {'VmRSS'}),
+    'modules': len(sys.modules),
+}
+gc.freeze()
+read, write = os.pipe()
+if os.fork() == 0:
+    gc.collect()
+    private = read_memory(
+        '/proc/self/smaps_rollup', {'Private_Clean', 'Private_Dirty'})
+    os.write(write, json.dumps(private).encode())
+    os._exit(0)
+os.close(write)
+os.wait()
+result['private'] = json.loads(os.read(read, 64))
+print(json.dumps(result))
+'''
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время загрузки приложения, память процесса и '
+            'собственную память воркера после fork для ролей сервиса')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--roles', nargs='+', default=['all', 'api', 'worker'],
+            choices=list(settings.ROLE_EXCLUDED_APPS))
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько самых долгих импортов верхнего уровня показать')
+
+    def run_probe(self, role):
+        env = dict(
+            os.environ,
+            SERVICE_ROLE=role,
+            DJANGO_SETTINGS_MODULE=os.environ['DJANGO_SETTINGS_MODULE'],
+        )
+        process = subprocess.run(
+            (sys.executable, '-X', 'importtime', '-c', PROBE),
+            env=env, cwd=settings.BASE_DIR, capture_output=True,
+            text=True, check=True,
+        )
+        return json.loads(process.stdout), process.stderr
+
+    def get_top_imports(self, importtime):
+        imports = []
+        for line in importtime.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line.split('|')
+            if name.startswith(' ' * 2) or not cumulative.strip().isdigit():
+                continue
+            imports.append((int(cumulative), name.strip()))
+        return sorted(imports, reverse=True)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"роль":<8} {"загрузка, мс":>13} {"RSS, МБ":>9} '
+            f'{"модулей":>8} {"воркер, МБ":>11}')
+        for role in options['roles']:
+            runs = []
+            for _ in range(options['repeat']):
+                result, importtime = self.run_probe(role)
+                runs.append(result)
+            load = statistics.median(run['load'] for run in runs)
+            rss = statistics.median(run['rss'] or 0 for run in runs)
+            private = statistics.median(run['private'] or 0 for run in runs)
+            self.stdout.write(
+                f'{role:<8} {load * 1000:>13.1f} {rss / MB:>9.1f} '
+                f'{runs[-1]["modules"]:>8} {private / MB:>11.1f}')
+            for cumulative, name in self.get_top_imports(
+                    importtime)[:options['top']]:
+                self.stdout.write(f'    {cumulative / 1000:>8.1f} мс  {name}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import update_signatures
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит MinHash/LSH-индекс похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), batch_size):
+            update_signatures(recipe_ids[start:start + batch_size])
+        self.stdout.write(f'Проиндексировано рецептов: {len(recipe_ids)}')
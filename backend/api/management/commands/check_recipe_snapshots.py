@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.snapshots import build_recipe_bodies, refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Сверяет Recipe.snapshot с данными рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать расходящиеся снимки')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stale = []
+        checked = 0
+        snapshots = Recipe.objects.order_by('id').values_list(
+            'id', 'snapshot')
+        last_id = 0
+        while True:
+            batch = dict(snapshots.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = max(batch)
+            checked += len(batch)
+            for recipe_id, body in build_recipe_bodies(list(batch)).items():
+                if batch[recipe_id] != body:
+                    stale.append(recipe_id)
+        self.stdout.write(
+            f'Проверено рецептов: {checked}, расходится: {len(stale)}')
+        if stale:
+            self.stdout.write(' '.join(map(str, stale[:100])))
+        if stale and options['fix']:
+            refresh_snapshots(stale)
+            self.stdout.write(self.style.SUCCESS('Снимки пересобраны'))
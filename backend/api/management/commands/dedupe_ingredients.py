@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_generation
+from recipes.ingredients import merge_duplicates
+from recipes.models import Ingredient, IngredientRecipe
+from recipes.similarity import update_signatures
+from recipes.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = ('Находит дубли ингредиентов и переносит рецепты на '
+            'каноническую запись')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fuzzy', action='store_true',
+            help='Объединять и похожие названия с той же единицей.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать найденные дубли.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mapping, recipe_ids = merge_duplicates(
+                Ingredient, IngredientRecipe,
+                fuzzy=options['fuzzy'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+            if options['dry_run']:
+                names = dict(Ingredient.objects.filter(
+                    id__in=set(mapping) | set(mapping.values())
+                ).values_list('id', 'name'))
+                for duplicate, canonical in sorted(mapping.items()):
+                    self.stdout.write(
+                        f'{names[duplicate]} ({duplicate}) -> '
+                        f'{names[canonical]} ({canonical})')
+            else:
+                recipe_ids = sorted(recipe_ids)
+                batch_size = options['batch_size']
+                for start in range(0, len(recipe_ids), batch_size):
+                    batch = recipe_ids[start:start + batch_size]
+                    refresh_snapshots(batch)
+                    update_signatures(batch)
+                transaction.on_commit(bump_generation)
+        self.stdout.write(
+            f'Дублей: {len(mapping)}, затронуто рецептов: {len(recipe_ids)}')
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import iter_recipe_archive
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты автора с картинками в ZIP-архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email автора')
+        parser.add_argument('output', help='Путь к архиву')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["email"]} не найден')
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_recipe_archive(author):
+                output.write(chunk)
+                size += len(chunk)
+        self.stdout.write(f'Записано {size} байт в {options["output"]}')
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import (get_pstats_dump, iter_collapsed,
+                           list_profile_paths, load_profile)
+
+
+class Command(BaseCommand):
+    help = ('Показывает сохранённые профили запросов и выгружает их '
+            'в формате collapsed stacks или pstats')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'profile_id', nargs='?',
+            help='Id профиля; без него выводится список профилей')
+        parser.add_argument(
+            '--format', choices=('collapsed', 'pstats', 'sql'),
+            default='collapsed', help='Формат выгрузки профиля')
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        if options['profile_id'] is None:
+            self.list_profiles()
+            return
+        try:
+            profile = load_profile(options['profile_id'])
+        except FileNotFoundError:
+            raise CommandError(f'Профиль {options["profile_id"]} не найден')
+        if options['format'] == 'pstats':
+            if not options['output']:
+                raise CommandError('Для pstats нужен --output')
+            with open(options['output'], 'wb') as output:
+                output.write(get_pstats_dump(profile))
+            return
+        if options['format'] == 'sql':
+            lines = (
+                f'{query["time"]:>9.3f} ms  {query["sql"]}'
+                for query in profile['sql']
+            )
+        else:
+            lines = iter_collapsed(profile)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.writelines(line + '\n' for line in lines)
+        else:
+            for line in lines:
+                self.stdout.write(line)
+
+    def list_profiles(self):
+        for path in list_profile_paths():
+            profile = load_profile(path.name.split('.')[0])
+            self.stdout.write(
+                f'{profile["id"]}  {profile["created"]}  '
+                f'{profile["status"]} {profile["method"]} {profile["path"]}  '
+                f'{profile["duration"]:.1f} ms  '
+                f'{len(profile["sql"])} SQL  {profile["reason"]}'
+            )
@@ -0,0 +1,68 @@
+import random
+
+from django.contrib.auth import get_user_model
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+
+User = get_user_model()
+
+
+def seed_recipes(count, authors=10, ingredients_per_recipe=8, tags=3):
+    """Создаёт синтетические рецепты для бенчмарков и аудита запросов.
+
+    Вызывается внутри transaction.atomic() с последующим откатом, чтобы
+    не оставлять данных в базе.
+    """
+    rnd = random.Random(count)
+    prefix = f'seed{rnd.randrange(10 ** 9)}'
+    User.objects.bulk_create(
+        User(
+            email=f'{prefix}-{i}@example.com',
+            username=f'{prefix}-{i}',
+            first_name='Автор',
+            last_name=str(i),
+        )
+        for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith=prefix))
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(
+            Tag(name=f'{prefix}-{i}', color=f'#{i:06x}', slug=f'{prefix}-{i}')
+            for i in range(tags)
+        )
+    tag_objects = list(Tag.objects.all()[:tags])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    if len(ingredient_ids) < ingredients_per_recipe * 4:
+        ingredients = [
+            Ingredient(name=f'{prefix} ингредиент {i}', measurement_unit='г')
+            for i in range(ingredients_per_recipe * 4)
+        ]
+        for ingredient in ingredients:
+            ingredient.set_normalized()
+        Ingredient.objects.bulk_create(ingredients)
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=users[i % len(users)],
+            name=f'{prefix} рецепт {i}',
+            image='recipes/image/seed.png',
+            text='Описание рецепта ' * 20,
+            cooking_time=rnd.randint(1, 120),
+        )
+        for i in range(count)
+    )
+    recipes = list(Recipe.objects.filter(name__startswith=prefix))
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                         amount=rnd.randint(1, 500))
+        for recipe in recipes
+        for ingredient_id in rnd.sample(
+            ingredient_ids, ingredients_per_recipe)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes
+        for tag in rnd.sample(tag_objects, rnd.randint(1, len(tag_objects)))
+    )
+    return recipes
@@ -0,0 +1,138 @@
+"""Метрики Prometheus для API.
+
+Под gunicorn значения пишутся в mmap-файлы каталога
+PROMETHEUS_MULTIPROC_DIR и складываются по всем воркерам при чтении
+/metrics; без этой переменной используется обычный реестр процесса.
+"""
+import os
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ('view', 'action', 'method', 'status'),
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов на HTTP-запрос',
+    ('view', 'action'),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+QUERY_DURATION = Histogram(
+    'foodgram_db_query_duration_seconds',
+    'Время выполнения SQL-запроса',
+    ('view', 'action'),
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам',
+    ('cache', 'result'),
+)
+SERIALIZER_DURATION = Histogram(
+    'foodgram_serializer_duration_seconds',
+    'Время построения serializer.data',
+    ('serializer', ),
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+IMAGE_PROCESSING = Histogram(
+    'foodgram_image_processing_seconds',
+    'Время разбора и проверки картинок',
+    ('operation', ),
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+WRITES = Counter(
+    'foodgram_writes_total',
+    'Записи в избранное, корзину и подписки',
+    ('model', 'action'),
+)
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+def record_write(model, action, count=1):
+    if count:
+        WRITES.labels(model._meta.model_name, action).inc(count)
+
+
+def get_view_labels(request):
+    """Класс view и действие DRF для подписей метрик."""
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched', ''
+    view = getattr(match.func, 'cls', None)
+    if view is None:
+        return match.view_name or match.func.__name__, ''
+    actions = getattr(match.func, 'actions', None) or {}
+    return view.__name__, actions.get(request.method.lower(), '')
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL-запросы по view и действию."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        view, action = get_view_labels(request)
+        REQUEST_LATENCY.labels(
+            view, action, request.method, response.status_code
+        ).observe(duration)
+        REQUEST_QUERIES.labels(view, action).observe(len(counter.durations))
+        query_duration = QUERY_DURATION.labels(view, action)
+        for query_time in counter.durations:
+            query_duration.observe(query_time)
+        return response
+
+
+class TimedSerializerMixin:
+    """Пишет время построения serializer.data в гистограмму."""
+
+    @property
+    def data(self):
+        serializer = getattr(self, 'child', self)
+        with SERIALIZER_DURATION.labels(type(serializer).__name__).time():
+            return super().data
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics(request):
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class FeedPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
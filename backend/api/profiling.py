@@ -0,0 +1,239 @@
+"""Профилирование отдельных запросов.
+
+Запрос профилируется, если сотрудник прислал заголовок
+PROFILING_HEADER или если он попал в выборку PROFILING_SAMPLE_RATE.
+Профиль - статистика cProfile, стеки из сэмплера и выполненный SQL -
+пишется в каталог PROFILING_ROOT, где хранятся последние
+PROFILING_MAX_PROFILES профилей.
+"""
+import base64
+import cProfile
+import gzip
+import json
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+SUFFIX = '.json.gz'
+
+
+class StackSampler(threading.Thread):
+    """Раз в interval секунд снимает стек потока запроса."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({get_module(code.co_filename)})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+def get_module(filename):
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            return filename[len(path) + 1:]
+    return filename
+
+
+class QueryRecorder:
+    """execute_wrapper, запоминающий SQL и время выполнения."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'many': many,
+                'time': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def get_root():
+    return Path(settings.PROFILING_ROOT)
+
+
+def save_profile(data):
+    """Сохраняет профиль и удаляет самые старые сверх лимита."""
+    root = get_root()
+    root.mkdir(parents=True, exist_ok=True)
+    profile_id = f'{time.time_ns()}-{os.getpid()}'
+    path = root / (profile_id + SUFFIX)
+    tmp_path = path.with_suffix('.tmp')
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as output:
+        json.dump({'id': profile_id, **data}, output, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    for old in list_profile_paths()[:-settings.PROFILING_MAX_PROFILES]:
+        old.unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profile_paths():
+    root = get_root()
+    if not root.is_dir():
+        return []
+    return sorted(
+        root.glob('*' + SUFFIX),
+        key=lambda path: tuple(map(int, path.name[:-len(SUFFIX)].split('-'))),
+    )
+
+
+def load_profile(profile_id):
+    path = get_root() / (profile_id + SUFFIX)
+    with gzip.open(path, 'rt', encoding='utf-8') as source:
+        return json.load(source)
+
+
+def get_pstats_dump(profile):
+    """Статистика cProfile в формате файла pstats/snakeviz."""
+    return base64.b64decode(profile['pstats'])
+
+
+def get_frame_name(func):
+    filename, _, name = func
+    return f'{name} ({get_module(filename)})'
+
+
+def get_cprofile_stacks(stats):
+    """Стеки из статистики cProfile, если сэмплер ничего не снял.
+
+    Собственное время функции в микросекундах относится к цепочке
+    самых тяжёлых вызывающих, так что граф вызовов приближается деревом.
+    """
+    stacks = Counter()
+    for func, (_, _, tottime, _, callers) in stats.items():
+        weight = round(tottime * 1_000_000)
+        if not weight:
+            continue
+        stack = [get_frame_name(func)]
+        seen = {func}
+        while callers:
+            func = max(callers, key=lambda caller: callers[caller][3])
+            if func in seen or func not in stats:
+                break
+            seen.add(func)
+            stack.append(get_frame_name(func))
+            callers = stats[func][4]
+        stacks[';'.join(reversed(stack))] += weight
+    return stacks
+
+
+def iter_collapsed(profile):
+    """Строки формата collapsed stacks для flamegraph.pl/speedscope."""
+    stacks = profile['stacks'] or get_cprofile_stacks(
+        marshal.loads(get_pstats_dump(profile)))
+    for stack, count in sorted(stacks.items()):
+        yield f'{stack} {count}'
+
+
+def get_staff_user(request):
+    """Сотрудник из сессии или из аутентификации DRF, иначе None.
+
+    DRF определяет пользователя по токену только внутри view, поэтому
+    здесь аутентификаторы вызываются заранее; токен при этом попадает в
+    кэш и повторная проверка во view ничего не стоит.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return user
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return None
+        if result is not None:
+            return result[0] if result[0].is_staff else None
+    return None
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос по заголовку сотрудника или по выборке.
+
+    Заголовок учитывается только после проверки, что запрос прислал
+    сотрудник: остальные запросы проходят без профилировщика.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.PROFILING_HEADER
+
+    def __call__(self, request):
+        user = None
+        if self.header in request.headers:
+            user = get_staff_user(request)
+        requested = user is not None
+        sampled = (not requested and settings.PROFILING_SAMPLE_RATE
+                   and random.random() < settings.PROFILING_SAMPLE_RATE)
+        if not (requested or sampled):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        recorder = QueryRecorder()
+        sampler = StackSampler(
+            threading.get_ident(), settings.PROFILING_INTERVAL)
+        started = timezone.now()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            sampler.start()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                stacks = sampler.stop()
+        duration = time.perf_counter() - start
+        if user is None:
+            user = getattr(request, 'user', None)
+        profiler.create_stats()
+        profile_id = save_profile({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'user': getattr(user, 'pk', None),
+            'reason': 'header' if requested else 'sample',
+            'created': started.isoformat(),
+            'duration': round(duration * 1000, 3),
+            'sql': recorder.queries,
+            'stacks': stacks,
+            'pstats': base64.b64encode(
+                marshal.dumps(profiler.stats)).decode(),
+        })
+        if requested:
+            response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с откатом на стандартный json.
+
+    Выдаёт те же байты, что и JSONRenderer: типы, которые orjson не знает
+    (Decimal, lazy-строки, QuerySet), и даты передаются в JSONEncoder DRF.
+    """
+
+    def __init__(self):
+        self.encoder = self.encoder_class()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder.default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                ),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+            ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
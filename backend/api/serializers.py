@@ -1,21 +1,38 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, models, transaction
+from django.urls import reverse
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
-from rest_framework.serializers import (CharField, IntegerField,
-                                        ModelSerializer,
-                                        PrimaryKeyRelatedField,
-                                        ReadOnlyField, SerializerMethodField)
-
+from rest_framework.serializers import (BooleanField, CharField,
+                                        IntegerField, ListField,
+                                        ListSerializer, ModelSerializer,
+                                        ReadOnlyField, Serializer,
+                                        SerializerMethodField,
+                                        ValidationError)
+from rest_framework.settings import api_settings
+
+from jobs.models import Job
 from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
                             Recipe, ShoppingCart, Tag)
-from .validators import (validate_favorite, validate_recipe,
-                         validate_shopping_cart, validate_subscription)
+from recipes.similarity import update_signatures
+from recipes.snapshots import refresh_snapshots
+from .fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                     BulkResolveListSerializer)
+from .metrics import TimedSerializerMixin
+from .payloads import UserOverlay, get_recipe_bodies
+from .validators import (is_unique_violation, validate_recipe,
+                         validate_subscription)
 
 User = get_user_model()
 
+BULK_MAX_ITEMS = 100
+
+
+class TimedListSerializer(TimedSerializerMixin, ListSerializer):
+    pass
+
 
-class UserSerializer(UserSerializer):
+class UserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
     password = CharField(write_only=True)
 
@@ -23,6 +40,7 @@ class UserSerializer(UserSerializer):
         model = User
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'password', 'is_subscribed', )
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
@@ -43,7 +61,26 @@ class UserSerializer(UserSerializer):
         return user
 
 
-class FollowSerializer(ModelSerializer):
+class UniqueRelationSerializer(ModelSerializer):
+    unique_constraint = None
+    unique_error = None
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError as error:
+            if not is_unique_violation(
+                    error, self.Meta.model, self.unique_constraint):
+                raise
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.unique_error]})
+
+
+class FollowSerializer(UniqueRelationSerializer):
+    unique_constraint = 'unique_follow'
+    unique_error = 'Вы уже подписались на этого автора'
+
     class Meta:
         model = Follow
         fields = ('user', 'author')
@@ -60,20 +97,22 @@ class FollowSerializer(ModelSerializer):
         return serializer.data
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, ModelSerializer):
 
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit', )
+        list_serializer_class = TimedListSerializer
 
 
 class IngredientRecipeWriteSerializer(ModelSerializer):
 
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'amount')
+        list_serializer_class = BulkResolveListSerializer
 
 
 class IngredientRecipeSerializer(ModelSerializer):
@@ -86,41 +125,71 @@ class IngredientRecipeSerializer(ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(TimedSerializerMixin, ModelSerializer):
 
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
+        list_serializer_class = TimedListSerializer
+
 
+class RecipeBodySerializer(ModelSerializer):
+    """Поля тела рецепта.
 
-class RecipeReadSerializer(ModelSerializer):
+    Флаги пользователя здесь всегда False: их накладывает UserOverlay
+    одним запросом на страницу, а не запросом на каждый рецепт.
+    """
     author = UserSerializer(read_only=True, many=False)
     tags = TagSerializer(read_only=True, many=True)
     ingredients = IngredientRecipeSerializer(
         read_only=True, many=True, source='ingredienttorecipe')
     image = Base64ImageField(max_length=None)
-    is_favorited = SerializerMethodField(read_only=True)
-    is_in_shopping_cart = SerializerMethodField(read_only=True)
+    is_favorited = BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('snapshot',)
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return obj.in_favorite.filter(user=request.user).exists()
 
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return obj.shopping_list.filter(user=request.user).exists()
+class RecipeListSerializer(TimedSerializerMixin, ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        recipes = list(data)
+        overlay = UserOverlay(self.context.get('request'), recipes)
+        bodies = get_recipe_bodies(recipes)
+        return [overlay.apply(body) for body in bodies]
+
+
+class RecipeReadSerializer(TimedSerializerMixin, RecipeBodySerializer):
+
+    class Meta(RecipeBodySerializer.Meta):
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        overlay = UserOverlay(self.context.get('request'), [instance])
+        body, = get_recipe_bodies([instance])
+        return overlay.apply(body)
+
+
+class RecipeShortSerializer(ModelSerializer):
+    image = Base64ImageField(read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'cooking_time')
+
+
+def get_recipes_limit(request, default=None):
+    if request and request.query_params.get('recipes_limit', '').isdigit():
+        return int(request.query_params['recipes_limit'])
+    return default
 
 
-class FollowReadSerializer(ModelSerializer):
-    recipes = RecipeReadSerializer(many=True, read_only=True)
+class FollowReadSerializer(TimedSerializerMixin, ModelSerializer):
+    recipes = SerializerMethodField()
     recipes_count = SerializerMethodField()
 
     class Meta:
@@ -129,9 +198,22 @@ class FollowReadSerializer(ModelSerializer):
             'email', 'id', 'username', 'first_name', 'last_name',
             'recipes', 'recipes_count'
         )
+        list_serializer_class = TimedListSerializer
+
+    def get_recipes(self, author):
+        limit = get_recipes_limit(
+            self.context.get('request'), self.context.get('recipes_limit'))
+        recipes = getattr(author, 'prefetched_recipes', None)
+        if recipes is None:
+            recipes = author.recipes.only(*RecipeShortSerializer.Meta.fields)
+        return RecipeShortSerializer(
+            recipes[:limit], many=True, context=self.context).data
 
     def get_recipes_count(self, author):
-        return Recipe.objects.filter(author=author).count()
+        recipes_count = getattr(author, 'recipes_count', None)
+        if recipes_count is None:
+            return Recipe.objects.filter(author=author).count()
+        return recipes_count
 
 
 class RecipeCreateSerializer(ModelSerializer):
@@ -139,7 +221,7 @@ class RecipeCreateSerializer(ModelSerializer):
     ingredients = IngredientRecipeWriteSerializer(
         many=True,
     )
-    tags = PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all(),
     )
     image = Base64ImageField(max_length=None)
@@ -171,7 +253,9 @@ class RecipeCreateSerializer(ModelSerializer):
             for ingredient_data in ingredients
         ]
         IngredientRecipe.objects.bulk_create(ingredient_list)
+        update_signatures([instance.id])
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -179,8 +263,10 @@ class RecipeCreateSerializer(ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self.add_tags(recipe, tags)
         self.add_ingredients(recipe, ingredients)
+        recipe.snapshot = refresh_snapshots([recipe.id])[recipe.id]
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -188,6 +274,7 @@ class RecipeCreateSerializer(ModelSerializer):
         instance.tags.clear()
         self.add_tags(instance, tags)
         self.add_ingredients(instance, ingredients)
+        instance.snapshot = refresh_snapshots([instance.id])[instance.id]
         return instance
 
     def to_representation(self, instance):
@@ -198,37 +285,68 @@ class RecipeCreateSerializer(ModelSerializer):
         return serializer.data
 
 
-class ShoppingCartSerializer(ModelSerializer):
+class ShoppingCartSerializer(UniqueRelationSerializer):
+    unique_constraint = 'unique_shoppingcart'
+    unique_error = 'Рецепт уже добавлен в корзину'
 
     class Meta:
         model = ShoppingCart
-        fields = ('user', 'recipe',)
-
-    def validate(self, data):
-        return validate_shopping_cart(self, data)
+        fields = ('user', 'recipe', 'servings')
+        read_only_fields = ('user', 'recipe',)
 
     def to_representation(self, instance):
-        recipe = instance.recipe
-        context = self.context
-        request = context.get('request')
-        serializer_context = {'request': request}
-        serializer = RecipeReadSerializer(recipe, context=serializer_context)
-        return serializer.data
+        return RecipeShortSerializer(
+            instance.recipe, context=self.context).data
 
 
-class FavoriteSerializer(ModelSerializer):
+class FavoriteSerializer(UniqueRelationSerializer):
+    unique_constraint = 'unique_favorites'
+    unique_error = 'Рецепт уже добавлен в избранное.'
 
     class Meta:
         model = Favorite
         fields = ('user', 'recipe',)
-
-    def validate(self, data):
-        return validate_favorite(self, data)
+        read_only_fields = ('user', 'recipe',)
 
     def to_representation(self, instance):
-        recipe = instance.recipe
-        context = self.context
-        request = context.get('request')
-        serializer_context = {'request': request}
-        serializer = RecipeReadSerializer(recipe, context=serializer_context)
-        return serializer.data
+        return RecipeShortSerializer(
+            instance.recipe, context=self.context).data
+
+
+class RecipeIdsSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+
+class AuthorIdsSerializer(Serializer):
+    authors = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
+
+
+class SimilarQuerySerializer(Serializer):
+    limit = IntegerField(min_value=1, max_value=50, default=10)
+
+
+class CatalogQuerySerializer(Serializer):
+    since = IntegerField(min_value=0, required=False)
+
+
+class JobSerializer(ModelSerializer):
+    result_url = SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'status', 'attempts', 'result',
+                  'result_url', 'created', 'finished')
+
+    def get_result_url(self, obj):
+        if obj.status != Job.DONE or not obj.result_file:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('api:jobs-result', args=(obj.id,)))
@@ -0,0 +1,89 @@
+from django.db.models import F, Sum
+
+from recipes.ingredients import normalize
+from recipes.models import IngredientRecipe
+
+MASS = 'г'
+VOLUME = 'мл'
+UNITS = {
+    'г': (MASS, 1),
+    'гр': (MASS, 1),
+    'кг': (MASS, 1000),
+    'мг': (MASS, 0.001),
+    'мл': (VOLUME, 1),
+    'л': (VOLUME, 1000),
+    'ст л': (VOLUME, 15),
+    'ч л': (VOLUME, 5),
+    'стакан': (VOLUME, 250),
+    'капля': (VOLUME, 0.05),
+}
+LARGE_UNITS = {MASS: ('кг', 1000), VOLUME: ('л', 1000)}
+UNCOUNTABLE_UNITS = {'по вкусу'}
+
+
+def format_amount(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def aggregate_ingredients(rows):
+    """Складывает количества с учётом единиц измерения.
+
+    rows - пары (название, единица) с суммарным количеством. Одинаковые
+    после нормализации ингредиенты объединяются, количества в
+    совместимых единицах (кг и г, ложки и мл) переводятся в базовую
+    единицу и суммируются одним проходом numpy. Возвращает тройки
+    (название, количество или None, единица), отсортированные по
+    названию.
+    """
+    if not rows:
+        return []
+    import numpy as np
+
+    keys = []
+    units = []
+    factors = np.empty(len(rows))
+    amounts = np.empty(len(rows))
+    for i, (name, unit, amount) in enumerate(rows):
+        unit_key = normalize(unit)
+        base_unit, factor = UNITS.get(unit_key, (unit, 1))
+        keys.append(f'{normalize(name)}\0{normalize(base_unit)}')
+        units.append(base_unit)
+        factors[i] = factor
+        amounts[i] = amount
+    unique_keys, first, groups = np.unique(
+        keys, return_index=True, return_inverse=True)
+    totals = np.bincount(groups, weights=amounts * factors)
+    result = []
+    for index, total in zip(first, totals):
+        name, unit = rows[index][0], units[index]
+        if normalize(unit) in UNCOUNTABLE_UNITS:
+            total = None
+        elif unit in LARGE_UNITS and total >= LARGE_UNITS[unit][1]:
+            unit, factor = LARGE_UNITS[unit]
+            total /= factor
+        result.append((name, total, unit))
+    return result
+
+
+def get_cart_rows(user):
+    return list(IngredientRecipe.objects.filter(
+        recipe__shopping_list__user=user
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum(F('amount') * F('recipe__shopping_list__servings'))
+    ).order_by())
+
+
+def build_shopping_list(user):
+    shopping_list = []
+    for i, (name, total_amount, measurement_unit) in enumerate(
+            aggregate_ingredients(get_cart_rows(user)), start=1):
+        measurement_unit = measurement_unit.rstrip('.')
+        if total_amount is None:
+            shopping_list.append(f"{i}. {name}  - {measurement_unit}.")
+        else:
+            shopping_list.append(
+                f"{i}. {name}  - {format_amount(total_amount)}"
+                f"{measurement_unit}.")
+    return '\n'.join(shopping_list)
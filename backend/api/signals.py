@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.snapshots import refresh_snapshots
+from .authentication import bump_user_version
+from .cache import bump_generation
+from .catalog import log_ingredient_change
+
+User = get_user_model()
+
+AUTHOR_DISPLAY_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes(sender, **kwargs):
+    transaction.on_commit(bump_generation)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_authors(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(bump_generation)
+
+
+def get_related_recipe_ids(instance):
+    if isinstance(instance, Tag):
+        recipes = Recipe.objects.filter(tags=instance)
+    else:
+        recipes = Recipe.objects.filter(
+            ingredienttorecipe__ingredient=instance)
+    return list(recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_related_snapshots(sender, instance, created, **kwargs):
+    if not created:
+        refresh_snapshots(get_related_recipe_ids(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_related_recipes(sender, instance, **kwargs):
+    instance.snapshot_recipe_ids = get_related_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_snapshots(sender, instance, **kwargs):
+    refresh_snapshots(getattr(instance, 'snapshot_recipe_ids', ()))
+
+
+@receiver(post_save, sender=User)
+def refresh_author_snapshots(sender, instance, created, update_fields=None,
+                             **kwargs):
+    if created or (
+            update_fields and not AUTHOR_DISPLAY_FIELDS & set(update_fields)):
+        return
+    # Полное сохранение (смена пароля, is_active и т.п.) обычно не трогает
+    # имя и почту: пересобираются только снимки с другим автором.
+    refresh_snapshots(instance.recipes.exclude(
+        snapshot={}
+    ).exclude(
+        snapshot__author__email=instance.email,
+        snapshot__author__username=instance.username,
+        snapshot__author__first_name=instance.first_name,
+        snapshot__author__last_name=instance.last_name,
+    ).values_list('id', flat=True).order_by())
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_user_version(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: bump_user_version(instance.pk))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, **kwargs):
+    log_ingredient_change(instance)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    log_ingredient_change(instance, deleted=True)
@@ -0,0 +1,183 @@
+"""Журнал медленных SQL-запросов.
+
+Обёртка ставится на каждое новое подключение к БД и пишет в логгер
+api.slow_queries запросы дольше SLOW_QUERY_THRESHOLD миллисекунд:
+отпечаток запроса, view и сериализатор, из которых он выполнен, место в
+коде проекта и план EXPLAIN на PostgreSQL. Один отпечаток пишется не
+чаще раза в SLOW_QUERY_LOG_INTERVAL секунд.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.serializers import BaseSerializer
+
+from .metrics import get_view_labels
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 4000
+MAX_FINGERPRINTS = 1000
+# Обёртки над view, которые ничего не говорят о происхождении запроса.
+SKIP_MODULES = {
+    'api/cache.py',
+    'api/compression.py',
+    'api/metrics.py',
+    'api/profiling.py',
+    'api/slow_queries.py',
+}
+
+current_request = ContextVar('current_request', default=None)
+explaining = ContextVar('explaining', default=False)
+
+literals = re.compile(
+    r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\$\d+|\bNULL\b", re.IGNORECASE)
+value_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+whitespace = re.compile(r'\s+')
+
+
+def get_fingerprint(sql):
+    """Запрос без значений: литералы и списки IN заменены на ?."""
+    normalized = literals.sub('?', sql)
+    normalized = value_lists.sub('(...)', normalized)
+    return whitespace.sub(' ', normalized).strip()
+
+
+def get_origin():
+    """Сериализатор и ближайший кадр кода проекта в текущем стеке."""
+    root = f'{settings.BASE_DIR}{os.sep}'
+    serializer = None
+    location = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if serializer is None and isinstance(instance, BaseSerializer):
+            serializer = type(getattr(instance, 'child', instance)).__name__
+        filename = frame.f_code.co_filename
+        module = filename[len(root):].replace(os.sep, '/')
+        if (location is None and filename.startswith(root)
+                and module not in SKIP_MODULES):
+            location = (
+                f'{module}:{frame.f_lineno} in {frame.f_code.co_name}')
+        if serializer and location:
+            break
+        frame = frame.f_back
+    return serializer, location
+
+
+class RateLimiter:
+    """Пропускает отпечаток не чаще раза в interval секунд."""
+
+    def __init__(self, interval, size=MAX_FINGERPRINTS):
+        self.interval = interval
+        self.size = size
+        self.last_seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """Возвращает число пропущенных повторов или None."""
+        now = time.monotonic()
+        with self.lock:
+            logged_at, suppressed = self.last_seen.get(key, (None, 0))
+            if logged_at is not None and now - logged_at < self.interval:
+                self.last_seen[key] = (logged_at, suppressed + 1)
+                return None
+            self.last_seen[key] = (now, 0)
+            self.last_seen.move_to_end(key)
+            while len(self.last_seen) > self.size:
+                self.last_seen.popitem(last=False)
+        return suppressed
+
+
+def explain(connection, sql, params):
+    if (connection.vendor != 'postgresql'
+            or not sql.lstrip()[:6].upper() == 'SELECT'):
+        return None
+    token = explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+    except Exception as error:
+        return f'EXPLAIN не выполнен: {error}'
+    finally:
+        explaining.reset(token)
+
+
+class SlowQueryLogger:
+
+    def __init__(self):
+        self.limiter = RateLimiter(settings.SLOW_QUERY_LOG_INTERVAL)
+
+    def __call__(self, execute, sql, params, many, context):
+        if explaining.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            self.log(context['connection'], sql, params, many, duration)
+        return result
+
+    def log(self, connection, sql, params, many, duration):
+        fingerprint = get_fingerprint(sql)
+        digest = hashlib.blake2b(
+            fingerprint.encode(), digest_size=8).hexdigest()
+        suppressed = self.limiter.allow(digest)
+        if suppressed is None:
+            return
+        request = current_request.get()
+        view, action = get_view_labels(request) if request else ('', '')
+        serializer, location = get_origin()
+        entry = {
+            'fingerprint': digest,
+            'duration_ms': round(duration, 3),
+            'alias': connection.alias,
+            'many': many,
+            'sql': fingerprint[:MAX_SQL_LENGTH],
+            'view': view,
+            'action': action,
+            'serializer': serializer,
+            'location': location,
+            'suppressed': suppressed,
+        }
+        if not many:
+            entry['explain'] = explain(connection, sql, params)
+        logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+slow_query_logger = SlowQueryLogger()
+
+
+@receiver(connection_created)
+def install_slow_query_logger(sender, connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает последнюю обёртку, а
+    # подключение часто открывается внутри такого контекста.
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_logger)
+
+
+class QueryOriginMiddleware:
+    """Запоминает текущий запрос, чтобы журнал знал его view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
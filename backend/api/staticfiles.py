@@ -0,0 +1,33 @@
+import gzip
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+
+GZIP_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json')
+
+
+class GzipStaticFilesStorage(StaticFilesStorage):
+    """Кладёт рядом со статикой сжатые .gz копии для gzip_static в nginx.
+
+    Файлы меньше COMPRESSION_MIN_SIZE и те, что не ужимаются, остаются
+    без копии.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in paths:
+            if not name.endswith(GZIP_EXTENSIONS):
+                continue
+            with self.open(name) as source:
+                content = source.read()
+            if len(content) < settings.COMPRESSION_MIN_SIZE:
+                continue
+            compressed = gzip.compress(content, 9, mtime=0)
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(f'{name}.gz'):
+                self.delete(f'{name}.gz')
+            self.save(f'{name}.gz', ContentFile(compressed))
+            yield name, f'{name}.gz', True
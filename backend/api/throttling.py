@@ -0,0 +1,166 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle
+
+SLOT = struct.Struct('<QqII')
+PROBE_SLOTS = 8
+
+
+def hash_key(key):
+    # Нулевой хэш означает пустой слот.
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class SharedMemoryCounterStore:
+    """Счётчики окон в mmap-файле, общем для всех воркеров gunicorn.
+
+    Каждый ключ занимает один слот фиксированного размера: полный хэш
+    ключа, номер окна, счётчики текущего и предыдущего окна. Ключ ищется
+    среди PROBE_SLOTS соседних слотов и занимает свободный или устаревший.
+    Если все они заняты живыми ключами, ключ делит счётчик с первым из
+    них: чужой счётчик никогда не сбрасывается. Слоты блокируются через
+    fcntl, поэтому проверка и инкремент атомарны между процессами.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.map = None
+
+    def open(self):
+        size = SLOT.size * self.slots
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+    def find_slot(self, key_hash, start, window):
+        """Смещение слота для ключа и хэш, под которым он там хранится."""
+        free = None
+        for offset in range(
+                start, start + PROBE_SLOTS * SLOT.size, SLOT.size):
+            stored_hash, stored_window, _, _ = SLOT.unpack_from(
+                self.map, offset)
+            if stored_hash == key_hash:
+                return offset, key_hash
+            if free is None and (
+                    not stored_hash or stored_window < window - 1):
+                free = offset
+        if free is not None:
+            return free, key_hash
+        return start, SLOT.unpack_from(self.map, start)[0]
+
+    def hit(self, key, window, duration, limit, previous_weight):
+        key_hash = hash_key(key)
+        start = key_hash % (self.slots - PROBE_SLOTS + 1) * SLOT.size
+        with self.lock:
+            if self.map is None:
+                self.open()
+            fcntl.lockf(
+                self.fd, fcntl.LOCK_EX, PROBE_SLOTS * SLOT.size, start)
+            try:
+                offset, owner_hash = self.find_slot(key_hash, start, window)
+                stored_hash, stored_window, current, previous = (
+                    SLOT.unpack_from(self.map, offset))
+                if stored_hash != owner_hash or stored_window < window - 1:
+                    current = previous = 0
+                elif stored_window == window - 1:
+                    current, previous = 0, current
+                estimate = previous * previous_weight + current
+                allowed = estimate < limit
+                if allowed:
+                    current += 1
+                SLOT.pack_into(
+                    self.map, offset, owner_hash, window, current, previous)
+            finally:
+                fcntl.lockf(
+                    self.fd, fcntl.LOCK_UN, PROBE_SLOTS * SLOT.size, start)
+        return allowed, estimate
+
+
+class CacheCounterStore:
+    """Счётчики окон в кэше Django, например в Redis или memcached.
+
+    Счётчик окна нужен до конца следующего окна, где он служит
+    предыдущим, поэтому живёт две длительности окна с запасом.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def hit(self, key, window, duration, limit, previous_weight):
+        current_key = f'throttle:{key}:{window}'
+        previous_key = f'throttle:{key}:{window - 1}'
+        counts = self.cache.get_many((current_key, previous_key))
+        estimate = (counts.get(previous_key, 0) * previous_weight
+                    + counts.get(current_key, 0))
+        allowed = estimate < limit
+        if allowed and not self.cache.add(
+                current_key, 1, 2 * duration + 60):
+            self.cache.incr(current_key)
+        return allowed, estimate
+
+
+_store = None
+
+
+def get_counter_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLE_STORE['BACKEND'])(
+            **settings.THROTTLE_STORE.get('OPTIONS', {}))
+    return _store
+
+
+class ActionRateThrottle(SimpleRateThrottle):
+    """Ограничение частоты для отдельных действий вьюсета.
+
+    Область берётся из view.get_throttle_scope(), если он есть, иначе из
+    view.throttle_scopes по имени действия; лимиты - из
+    DEFAULT_THROTTLE_RATES. Используется скользящее окно из двух
+    счётчиков: текущего и предыдущего с весом оставшейся доли окна.
+    """
+
+    def __init__(self):
+        pass
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        get_scope = getattr(view, 'get_throttle_scope', None)
+        if get_scope is not None:
+            self.scope = get_scope()
+        else:
+            self.scope = getattr(view, 'throttle_scopes', {}).get(
+                getattr(view, 'action', None))
+        if self.scope not in self.THROTTLE_RATES:
+            return True
+        self.num_requests, self.duration = self.parse_rate(
+            self.THROTTLE_RATES[self.scope])
+        position = self.timer() / self.duration
+        window = int(position)
+        previous_weight = 1 - (position - window)
+        allowed, estimate = get_counter_store().hit(
+            self.get_cache_key(request, view), window, self.duration,
+            self.num_requests, previous_weight)
+        if not allowed:
+            self.wait_time = (window + 1 - position) * self.duration
+        return allowed
+
+    def wait(self):
+        return self.wait_time
@@ -1,6 +1,6 @@
 from django.core.exceptions import ValidationError
 
-from recipes.models import Favorite, Follow, Recipe, ShoppingCart
+from recipes.models import Recipe
 
 
 def validate_recipe(serializer, data):
@@ -24,29 +24,27 @@ def validate_recipe(serializer, data):
     return data
 
 
-def validate_shopping_cart(serializer, data):
-    user = data['user']
-    recipe = data['recipe']
-    if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-        raise ValidationError('Рецепт уже добавлен в корзину')
-    return data
-
-
-def validate_favorite(serializer, data):
-    user = data['user']
-    recipe = data['recipe']
-    if Favorite.objects.filter(user=user, recipe=recipe).exists():
-        raise ValidationError('Рецепт уже добавлен в избранное.')
-    return data
-
-
 def validate_subscription(serializer, attrs):
-    user = attrs['user']
-    author = attrs['author']
-    if user == author:
+    if attrs['user'] == attrs['author']:
         raise ValidationError('Нельзя подписаться на самого себя')
-    existing_subscription = Follow.objects.filter(
-        user=user, author=author).exists()
-    if existing_subscription:
-        raise ValidationError('Вы уже подписались на этого автора')
     return attrs
+
+
+def is_unique_violation(error, model, constraint):
+    """Нарушено ли именно ограничение constraint модели model.
+
+    psycopg2 сообщает имя ограничения; SQLite - только таблицу и
+    столбцы, поэтому сверяются столбцы этого ограничения.
+    """
+    diag = getattr(error.__cause__, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name == constraint
+    opts = model._meta
+    for unique in opts.constraints:
+        if unique.name == constraint:
+            columns = ', '.join(
+                f'{opts.db_table}.{opts.get_field(name).column}'
+                for name in unique.fields
+            )
+            return str(error) == f'UNIQUE constraint failed: {columns}'
+    return False
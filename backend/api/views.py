@@ -1,24 +1,40 @@
-from django.db.models import Sum
+from django.db.models import Count, OuterRef, Prefetch, Subquery
 from django.contrib.auth import get_user_model
-from django.http.response import HttpResponse
+from django.http import Http404
+from django.http.response import (FileResponse, HttpResponse,
+                                  StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Follow, Ingredient,
-                            IngredientRecipe, Recipe, ShoppingCart,
-                            Tag)
+from jobs.models import Job
+from jobs.registry import enqueue
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from recipes.similarity import find_similar
+from .bulk import insert_missing
+from .cache import AnonymousResponseCacheMixin
+from .catalog import (etag_matches, get_catalog_payloads,
+                      get_catalog_version)
+from .export import iter_recipe_archive
 from .filters import IngredientFilter, RecipeFilter
+from .metrics import record_write
+from .pagination import FeedPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, FollowReadSerializer,
+from .serializers import (AuthorIdsSerializer, CatalogQuerySerializer,
+                          FavoriteSerializer, FollowReadSerializer,
                           FollowSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeReadSerializer,
-                          ShoppingCartSerializer, TagSerializer,
-                          UserSerializer)
+                          JobSerializer, RecipeCreateSerializer,
+                          RecipeIdsSerializer, RecipeReadSerializer,
+                          RecipeShortSerializer, ShoppingCartSerializer,
+                          SimilarQuerySerializer, TagSerializer,
+                          UserSerializer, get_recipes_limit)
+from .shopping_list import build_shopping_list
 
 User = get_user_model()
 
@@ -26,6 +42,10 @@ User = get_user_model()
 class UserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    throttle_scopes = {
+        'create': 'user_create',
+        'add_delete_subscriptions': 'bulk_write',
+    }
 
     @action(
         detail=False,
@@ -33,17 +53,29 @@ class UserViewSet(UserViewSet):
         permission_classes=[IsAuthenticated],
     )
     def get_subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        limit = get_recipes_limit(request, 3)
+        # Последние limit рецептов каждого автора отбираются в SQL
+        # коррелированным подзапросом по индексу (author, -pub_date).
+        latest = Recipe.objects.filter(
+            author_id=OuterRef('author_id')
+        ).order_by('-pub_date').values('id')[:limit]
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(recipes_count=Count('recipes')).order_by(
+            'username'
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.filter(
+                id__in=Subquery(latest)
+            ).only('author_id', *RecipeShortSerializer.Meta.fields),
+            to_attr='prefetched_recipes',
+        ))
         pages = self.paginate_queryset(queryset)
         serializer = FollowReadSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True,
+            context={'request': request, 'recipes_limit': limit}
         )
-        data = serializer.data
-        for author in data:
-            recipes = Recipe.objects.filter(author=author['id'])[:3]
-            recipe_serializer = RecipeReadSerializer(recipes, many=True)
-            author['recipes'] = recipe_serializer.data
-        return self.get_paginated_response(data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['post', 'delete'], detail=True,
@@ -61,6 +93,7 @@ class UserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            record_write(Follow, 'create')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         subscription = get_object_or_404(
             Follow,
@@ -68,14 +101,50 @@ class UserViewSet(UserViewSet):
             user=request.user
         )
         self.perform_destroy(subscription)
+        record_write(Follow, 'delete')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['post', 'delete'], detail=False,
+        url_path='subscribe',
+        permission_classes=[IsAuthenticated],
+    )
+    def add_delete_subscriptions(self, request):
+        serializer = AuthorIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = set(serializer.validated_data['authors'])
+        if request.method == 'POST':
+            if request.user.id in author_ids:
+                raise ValidationError(
+                    {'authors': ['Нельзя подписаться на самого себя']})
+            created = insert_missing(
+                Follow, request.user, 'author', author_ids)
+            record_write(Follow, 'create', len(created))
+            return Response(
+                {'authors': sorted(created),
+                 'skipped': sorted(author_ids - created)},
+                status=(status.HTTP_201_CREATED if created
+                        else status.HTTP_200_OK),
+            )
+        deleted, _ = Follow.objects.filter(
+            user=request.user, author_id__in=author_ids).delete()
+        record_write(Follow, 'delete', deleted)
+        return Response({'deleted': deleted})
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
     permission_classes = (IsAuthorOrReadOnly, )
     filterset_class = RecipeFilter
+    response_cache_params = ('tags', 'author', 'page', 'limit')
+    throttle_scopes = {
+        'create': 'recipe_create',
+        'download_shopping_cart': 'shopping_cart_download',
+        'add_delete_favorites': 'bulk_write',
+        'add_delete_shopping_carts': 'bulk_write',
+        'export': 'recipe_export',
+    }
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -84,28 +153,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def add_or_delete_object(
             self, request, pk, serializer_class, object_class):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RecipeShortSerializer.Meta.fields), id=pk)
         if request.method == 'POST':
-            data = {
-                'user': request.user.id,
-                'recipe': recipe.id
-            }
             serializer = serializer_class(
-                data=data,
+                data=request.data,
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            serializer.save(user=request.user, recipe=recipe)
+            record_write(object_class, 'create')
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
             )
-        get_object_or_404(
-            object_class,
-            user=request.user.id,
-            recipe=recipe).delete()
+        deleted, _ = object_class.objects.filter(
+            user=request.user, recipe=recipe).delete()
+        if not deleted:
+            raise Http404
+        record_write(object_class, 'delete', deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def add_or_delete_objects(self, request, object_class):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = set(serializer.validated_data['recipes'])
+        if request.method == 'POST':
+            created = insert_missing(
+                object_class, request.user, 'recipe', recipe_ids)
+            record_write(object_class, 'create', len(created))
+            return Response(
+                {'recipes': sorted(created),
+                 'skipped': sorted(recipe_ids - created)},
+                status=(status.HTTP_201_CREATED if created
+                        else status.HTTP_200_OK),
+            )
+        deleted, _ = object_class.objects.filter(
+            user=request.user, recipe_id__in=recipe_ids).delete()
+        record_write(object_class, 'delete', deleted)
+        return Response({'deleted': deleted})
+
     @action(
         methods=('post', 'delete'),
         detail=True,
@@ -125,24 +212,86 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.add_or_delete_object(
             request, pk, ShoppingCartSerializer, ShoppingCart)
 
-    @action(detail=False, url_path='download_shopping_cart')
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def add_delete_favorites(self, request):
+        return self.add_or_delete_objects(request, Favorite)
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def add_delete_shopping_carts(self, request):
+        return self.add_or_delete_objects(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        url_path='feed',
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        queryset = self.filter_queryset(Recipe.objects.filter(
+            author__in=Follow.objects.filter(
+                user=request.user).values('author')
+        ))
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeReadSerializer(
+            page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, url_path='similar')
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe.objects.only('id'), id=pk)
+        serializer = SimilarQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = find_similar(
+            recipe.id, serializer.validated_data['limit'])
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = RecipeReadSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True,
+            context={'request': request},
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=[IsAuthenticated],
+    )
     def download_shopping_cart(self, request):
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
-        shopping_list = []
-        for i, ingredient in enumerate(ingredients, start=1):
-            name = ingredient['ingredient__name']
-            total_amount = ingredient['total_amount']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            shopping_list.append(
-                f"{i}. {name}  - {total_amount}{measurement_unit}.")
+        if request.query_params.get('background') in ('1', 'true'):
+            job = enqueue('shopping_list', user=request.user)
+            return Response(
+                JobSerializer(job, context={'request': request}).data,
+                status=status.HTTP_202_ACCEPTED,
+            )
         return HttpResponse(
-            '\n'.join(shopping_list), content_type='text/plain'
+            build_shopping_list(request.user), content_type='text/plain'
         )
 
+    @action(
+        detail=False,
+        url_path='export',
+        permission_classes=[IsAuthenticated]
+    )
+    def export(self, request):
+        response = StreamingHttpResponse(
+            iter_recipe_archive(request.user),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.zip"')
+        return response
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
@@ -151,10 +300,55 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (IngredientFilter, )
     pagination_class = None
     search_fields = ('^name', )
+    throttle_scopes = {'list': 'ingredient_search'}
+
+    def get_throttle_scope(self):
+        # Без name это полный список, а не поиск по мере набора.
+        if IngredientFilter.search_param not in self.request.query_params:
+            return None
+        return self.throttle_scopes.get(self.action)
 
+    @action(detail=False, url_path='catalog', filter_backends=())
+    def catalog(self, request):
+        serializer = CatalogQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data.get('since')
+        version = get_catalog_version()
+        if since is not None and since > version:
+            raise ValidationError({'since': 'Такой версии справочника нет.'})
+        etag = f'W/"catalog-{since}-{version}"'
+        if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            payloads = get_catalog_payloads(version, since)
+            response = HttpResponse(
+                payloads['identity'], content_type='application/json')
+            response.compressed_variants = payloads
+        response['ETag'] = etag
+        return response
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class TagViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = None
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated, )
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=True, url_path='result')
+    def result(self, request, pk):
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result_file:
+            raise Http404
+        return FileResponse(
+            job.result_file.open('rb'),
+            as_attachment=True,
+            filename='shopping_list.txt',
+        )
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -30,17 +31,62 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
     "colorfield",
 ]
 
+# Роль процесса: all - всё сразу, api - только API без админки и сессий,
+# worker - обработчик фоновых задач без HTTP.
+SERVICE_ROLE = os.getenv('SERVICE_ROLE', 'all')
+ROLE_EXCLUDED_APPS = {
+    'all': (),
+    'api': (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+    ),
+    'worker': (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    ),
+}
+if SERVICE_ROLE not in ROLE_EXCLUDED_APPS:
+    raise ImproperlyConfigured(
+        f'Неизвестная роль SERVICE_ROLE={SERVICE_ROLE!r}, допустимые: '
+        f'{", ".join(ROLE_EXCLUDED_APPS)}.')
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in ROLE_EXCLUDED_APPS[SERVICE_ROLE]
+]
+
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.slow_queries.QueryOriginMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+]
+
+ROLE_EXCLUDED_MIDDLEWARE = {
+    'all': (),
+    'api': (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ),
+}
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in ROLE_EXCLUDED_MIDDLEWARE.get(SERVICE_ROLE, ())
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -74,6 +120,33 @@ DATABASES = {
     }
 }
 
+# В кэше лежат поколение данных о рецептах и версии пользователей для
+# кэша токенов, поэтому все контейнеры backend и worker должны видеть
+# один и тот же кэш: в compose это memcached. Файловый кэш по умолчанию
+# подходит только для запуска в одном контейнере.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+    }
+}
+if CACHE_BACKEND.endswith('FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    }
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CONTENT_TYPES = (
+    'application/json',
+    'text/plain',
+    'text/html',
+    'text/csv',
+)
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -103,10 +176,50 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
+# collectstatic кладёт рядом .gz копии, nginx отдаёт их через gzip_static.
+STATICFILES_STORAGE = 'api.staticfiles.GzipStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+JOB_RESULTS_ROOT = os.getenv('JOB_RESULTS_ROOT', BASE_DIR / 'job_results')
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 30))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 600))
+JOB_RESULTS_TTL = int(os.getenv('JOB_RESULTS_TTL', 24 * 60 * 60))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+
+PROFILING_ROOT = os.getenv('PROFILING_ROOT', BASE_DIR / 'profiles')
+PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.005))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 100))
+
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 200))
+SLOW_QUERY_LOG_INTERVAL = int(os.getenv('SLOW_QUERY_LOG_INTERVAL', 60))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_queries': {
+            'format': '{asctime} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'slow_queries',
+        },
+    },
+    'loggers': {
+        'api.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': os.getenv('SLOW_QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -114,13 +227,47 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ActionRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'recipe_create': os.getenv('THROTTLE_RECIPE_CREATE', '60/hour'),
+        'shopping_cart_download': os.getenv(
+            'THROTTLE_SHOPPING_CART_DOWNLOAD', '30/hour'),
+        'ingredient_search': os.getenv(
+            'THROTTLE_INGREDIENT_SEARCH', '120/min'),
+        'bulk_write': os.getenv('THROTTLE_BULK_WRITE', '60/hour'),
+        'user_create': os.getenv('THROTTLE_USER_CREATE', '20/hour'),
+        'recipe_export': os.getenv('THROTTLE_RECIPE_EXPORT', '10/hour'),
+    },
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
+THROTTLE_STORE = {
+    'BACKEND': os.getenv(
+        'THROTTLE_STORE_BACKEND', 'api.throttling.SharedMemoryCounterStore'),
+    'OPTIONS': {
+        'path': os.getenv('THROTTLE_STORE_PATH', '/dev/shm/foodgram_throttle'),
+    },
 }
 
 DJOSER = {
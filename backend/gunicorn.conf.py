@@ -0,0 +1,37 @@
+import gc
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+# Приложение импортируется один раз в мастере, воркеры получают его
+# через fork и делят страницы памяти, пока не изменят их.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Каталог метрик чистится до загрузки приложения: при preload_app
+# prometheus_client импортируется в мастере раньше хука on_starting.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def when_ready(server):
+    # Объекты, загруженные в мастере, уходят из-под сборщика мусора:
+    # иначе его проходы в воркерах трогают их и копируют страницы.
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Подключения, открытые в мастере, нельзя делить между процессами.
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
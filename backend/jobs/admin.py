@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from recipes.paginators import ApproximateCountPaginator
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'user', 'attempts', 'created',
+                    'finished')
+    list_filter = ('status', 'kind')
+    search_fields = ('kind',)
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
@@ -0,0 +1,51 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди. Для нескольких '
+            'процессов достаточно запустить команду несколько раз.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', dest='kinds',
+            help='Брать только задачи этого типа; можно повторять.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить все готовые задачи и завершиться.')
+        parser.add_argument(
+            '--sleep', type=float, default=settings.JOB_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунд.')
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker = Worker(
+            f'{socket.gethostname()}:{os.getpid()}', options['kinds'])
+        worker.requeue_stale()
+        worker.purge_finished()
+        last_requeue = time.monotonic()
+        done = 0
+        while not self.stopping:
+            if worker.run_once():
+                done += 1
+                continue
+            if options['once']:
+                break
+            if time.monotonic() - last_requeue > settings.JOB_LOCK_TIMEOUT:
+                worker.requeue_stale()
+                worker.purge_finished()
+                last_requeue = time.monotonic()
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Обработано задач: {done}')
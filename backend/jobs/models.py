@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+
+User = get_user_model()
+
+
+def get_result_storage():
+    return FileSystemStorage(location=settings.JOB_RESULTS_ROOT)
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField(verbose_name='Тип задачи', max_length=100)
+    payload = models.JSONField(
+        verbose_name='Параметры', default=dict, blank=True)
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток', default=3)
+    run_at = models.DateTimeField(
+        verbose_name='Запустить после', default=timezone.now)
+    locked_by = models.CharField(
+        verbose_name='Воркер', max_length=100, blank=True)
+    locked_at = models.DateTimeField(
+        verbose_name='Взята в работу', null=True, blank=True)
+    result = models.JSONField(
+        verbose_name='Результат', default=dict, blank=True)
+    result_file = models.FileField(
+        verbose_name='Файл результата',
+        storage=get_result_storage,
+        blank=True,
+    )
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created = models.DateTimeField(
+        verbose_name='Создана', auto_now_add=True)
+    finished = models.DateTimeField(
+        verbose_name='Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(fields=('status', 'run_at'), name='job_queue_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.kind} #{self.id} ({self.status})'
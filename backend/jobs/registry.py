@@ -0,0 +1,20 @@
+from .models import Job
+
+handlers = {}
+
+
+def register(kind):
+    """Регистрирует обработчик задач типа kind.
+
+    Обработчик получает Job и возвращает словарь для Job.result.
+    """
+    def decorator(func):
+        handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, user=None, **payload):
+    if kind not in handlers:
+        raise ValueError(f'Неизвестный тип задачи: {kind}')
+    return Job.objects.create(kind=kind, user=user, payload=payload)
@@ -0,0 +1,119 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Job
+from .registry import handlers
+
+
+class Worker:
+    """Берёт задачи из таблицы Job и выполняет их.
+
+    Задача захватывается через SELECT ... FOR UPDATE SKIP LOCKED и
+    условный UPDATE по статусу, поэтому несколько процессов run_worker
+    не возьмут одну задачу дважды и на PostgreSQL, и на SQLite.
+    """
+
+    def __init__(self, name, kinds=None):
+        self.name = name
+        self.kinds = kinds
+
+    def claim(self):
+        now = timezone.now()
+        queryset = Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        if self.kinds:
+            queryset = queryset.filter(kind__in=self.kinds)
+        with transaction.atomic():
+            job = queryset.select_for_update(
+                skip_locked=True).order_by('run_at', 'id').first()
+            if job is None:
+                return None
+            claimed = Job.objects.filter(
+                id=job.id, status=Job.QUEUED
+            ).update(
+                status=Job.RUNNING,
+                attempts=job.attempts + 1,
+                locked_by=self.name,
+                locked_at=now,
+            )
+        if not claimed:
+            return None
+        job.refresh_from_db()
+        return job
+
+    def requeue_stale(self):
+        """Возвращает в очередь задачи воркеров, которые упали."""
+        stale = Job.objects.filter(
+            status=Job.RUNNING,
+            locked_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOB_LOCK_TIMEOUT),
+        )
+        for job in stale:
+            self.fail(job, f'Воркер {job.locked_by} не завершил задачу')
+
+    def purge_finished(self):
+        """Удаляет завершённые задачи старше JOB_RESULTS_TTL с файлами."""
+        finished = Job.objects.filter(
+            status__in=(Job.DONE, Job.FAILED),
+            finished__lt=timezone.now() - timedelta(
+                seconds=settings.JOB_RESULTS_TTL),
+        )
+        for job in finished.exclude(result_file=''):
+            job.result_file.delete(save=False)
+        return finished.delete()[0]
+
+    def update_locked(self, job, **fields):
+        """Сохраняет задачу, только если она всё ещё захвачена так же.
+
+        Задачу могли вернуть в очередь, взять заново или завершить, пока
+        этот процесс работал с ней; тогда обновление ничего не меняет.
+        """
+        return Job.objects.filter(
+            id=job.id, status=Job.RUNNING, locked_at=job.locked_at
+        ).update(**fields)
+
+    def run(self, job):
+        handler = handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f'Неизвестный тип задачи: {job.kind}')
+            result = handler(job)
+        except Exception:
+            self.fail(job, traceback.format_exc())
+            return
+        updated = self.update_locked(
+            job,
+            status=Job.DONE,
+            result=result or {},
+            result_file=job.result_file.name or '',
+            error='',
+            finished=timezone.now(),
+        )
+        if not updated and job.result_file:
+            job.result_file.delete(save=False)
+
+    def fail(self, job, error):
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            self.update_locked(
+                job,
+                status=Job.QUEUED,
+                error=error,
+                run_at=now + timedelta(
+                    seconds=settings.JOB_RETRY_DELAY * 2 ** (
+                        job.attempts - 1)),
+            )
+        else:
+            self.update_locked(
+                job, status=Job.FAILED, error=error, finished=now)
+
+    def run_once(self):
+        close_old_connections()
+        job = self.claim()
+        if job is None:
+            return False
+        self.run(job)
+        return True
@@ -1,29 +1,58 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import (Favorite, Follow, Ingredient, IngredientRecipe,
                      Recipe, Tag, ShoppingCart)
+from .paginators import ApproximateCountPaginator
+from .similarity import update_signatures
+from .snapshots import refresh_snapshots
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
 
 
 class IngredientRecipeInline(admin.TabularInline):
     model = IngredientRecipe
     extra = 1
+    autocomplete_fields = ('ingredient', )
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdmin):
     inlines = (IngredientRecipeInline, )
-    list_display = ('author', 'name', 'cooking_time')
-    search_fields = ('name', 'author', 'tags')
-    list_filter = ('author', 'name', 'tags')
-    empty_value_display = '-пусто-'
+    list_display = ('name', 'author', 'cooking_time', 'favorites_count')
+    list_select_related = ('author', )
+    search_fields = ('name', 'author__username')
+    list_filter = ('tags', )
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', )
+
+    def get_queryset(self, request):
+        favorites = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            count=Count('id')).values('count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(Subquery(favorites), 0))
+
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def favorites_count(self, obj):
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_snapshots([form.instance.id])
+        update_signatures([form.instance.id])
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name', )
-    list_filter = ('name', )
-    empty_value_display = '-пусто-'
 
 
 @admin.register(Tag)
@@ -35,24 +64,24 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    search_fields = ('user', 'recipe')
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(ScalableAdmin):
     list_display = ('recipe', 'user')
-    list_filter = ('recipe', 'user')
-    search_fields = ('user', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe', 'user')
+    search_fields = ('user__username', 'recipe__name')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('author', 'user')
-    list_filter = ('author', 'user')
-    search_fields = ('user', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('author', 'user')
+    search_fields = ('user__username', 'author__username')
+    raw_id_fields = ('user', 'author')
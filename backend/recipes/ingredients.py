@@ -0,0 +1,145 @@
+"""Поиск и слияние дублей ингредиентов.
+
+Функции принимают классы моделей параметрами, поэтому работают и с
+текущими моделями, и с историческими из миграций.
+"""
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from django.db.models import BigIntegerField, Case, Value, When
+
+MAX_AMOUNT = 32767
+FUZZY_RATIO = 0.9
+FUZZY_WINDOW = 3
+
+
+@lru_cache(maxsize=4096)
+def normalize(text):
+    """Ключ для сравнения названий и единиц: регистр, ё, точки и
+    пробелы не важны."""
+    return ' '.join(re.sub(r'[.\s]+', ' ', text.lower()).replace(
+        'ё', 'е').split())
+
+
+def find_duplicate_groups(rows, fuzzy=False):
+    """Группирует строки (id, название, единица) с одинаковым ключом.
+
+    Точные дубли ищутся по хэшу нормализованной пары. При fuzzy=True
+    соседние после сортировки названия с той же единицей сравниваются
+    в окне FUZZY_WINDOW, так что число сравнений линейно. Возвращает
+    словарь {id дубля: id канонической записи}; каноническая - с
+    наименьшим id.
+    """
+    groups = {}
+    for ingredient_id, name, unit in rows:
+        key = (normalize(unit), normalize(name))
+        groups.setdefault(key, []).append(ingredient_id)
+    parent = {min(ids): min(ids) for ids in groups.values()}
+
+    def find(ingredient_id):
+        while parent[ingredient_id] != ingredient_id:
+            ingredient_id = parent[ingredient_id]
+        return ingredient_id
+
+    if fuzzy:
+        keys = sorted(groups)
+        for i, (unit, name) in enumerate(keys):
+            for other_unit, other_name in keys[i + 1:i + 1 + FUZZY_WINDOW]:
+                if other_unit != unit:
+                    break
+                if SequenceMatcher(
+                        None, name, other_name).ratio() >= FUZZY_RATIO:
+                    first = find(min(groups[unit, name]))
+                    second = find(min(groups[other_unit, other_name]))
+                    parent[max(first, second)] = min(first, second)
+    mapping = {}
+    for ids in groups.values():
+        canonical = find(min(ids))
+        for ingredient_id in ids:
+            if ingredient_id != canonical:
+                mapping[ingredient_id] = canonical
+    return mapping
+
+
+def remap_ingredients(ingredient_recipe_model, mapping):
+    """Переносит строки рецептов на канонические ингредиенты.
+
+    Если в рецепте есть и дубль, и каноническая запись, остаётся одна
+    строка с суммой количеств, поэтому unique_ingredient_recipe не
+    нарушается. Возвращает id затронутых рецептов.
+    """
+    canonical_ids = set(mapping.values())
+    rows = ingredient_recipe_model.objects.filter(
+        ingredient_id__in=set(mapping) | canonical_ids
+    ).order_by('id').values_list('id', 'recipe_id', 'ingredient_id',
+                                 'amount')
+    kept = {}
+    amounts = {}
+    merged = set()
+    delete_ids = []
+    recipe_ids = set()
+    for row_id, recipe_id, ingredient_id, amount in rows:
+        canonical = mapping.get(ingredient_id, ingredient_id)
+        if ingredient_id != canonical:
+            recipe_ids.add(recipe_id)
+        key = (recipe_id, canonical)
+        if key not in kept:
+            kept[key] = row_id
+            amounts[row_id] = amount
+            continue
+        merged.add(key)
+        total = min(amounts.pop(kept[key]) + amount, MAX_AMOUNT)
+        if ingredient_id == canonical:
+            delete_ids.append(kept[key])
+            kept[key] = row_id
+        else:
+            delete_ids.append(row_id)
+        amounts[kept[key]] = total
+    ingredient_recipe_model.objects.filter(id__in=delete_ids).delete()
+    ingredient_recipe_model.objects.bulk_update(
+        [
+            ingredient_recipe_model(id=kept[key], amount=amounts[kept[key]])
+            for key in merged
+        ],
+        ('amount',),
+        batch_size=500,
+    )
+    ingredient_recipe_model.objects.filter(
+        ingredient_id__in=mapping
+    ).update(ingredient_id=Case(
+        *(When(ingredient_id=duplicate, then=Value(canonical))
+          for duplicate, canonical in mapping.items()),
+        output_field=BigIntegerField(),
+    ))
+    return recipe_ids
+
+
+def merge_duplicates(ingredient_model, ingredient_recipe_model,
+                     fuzzy=False, batch_size=500, dry_run=False):
+    """Сливает дубли ингредиентов порциями по batch_size групп.
+
+    Возвращает словарь {id дубля: id канонической записи} и id рецептов,
+    у которых поменялись ингредиенты.
+    """
+    mapping = find_duplicate_groups(
+        ingredient_model.objects.values_list(
+            'id', 'name', 'measurement_unit').iterator(),
+        fuzzy=fuzzy,
+    )
+    recipe_ids = set()
+    if dry_run:
+        return mapping, recipe_ids
+    by_canonical = {}
+    for duplicate, canonical in mapping.items():
+        by_canonical.setdefault(canonical, []).append(duplicate)
+    canonicals = sorted(by_canonical)
+    for start in range(0, len(canonicals), batch_size):
+        batch = {
+            duplicate: canonical
+            for canonical in canonicals[start:start + batch_size]
+            for duplicate in by_canonical[canonical]
+        }
+        recipe_ids |= remap_ingredients(ingredient_recipe_model, batch)
+        ingredient_model.objects.filter(id__in=batch).delete()
+    return mapping, recipe_ids
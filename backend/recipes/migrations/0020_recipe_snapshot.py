@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_ingredientrecipe_unique_ingredient_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Снимок для чтения'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0021_recipe_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('minhash', models.BinaryField(verbose_name='MinHash-подпись')),
+            ],
+            options={
+                'verbose_name': 'Подпись рецепта',
+                'verbose_name_plural': 'Подписи рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Полоса LSH')),
+                ('bucket', models.BigIntegerField(verbose_name='Корзина LSH')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Корзина LSH',
+                'verbose_name_plural': 'Корзины LSH',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipebucket',
+            index=models.Index(fields=['band', 'bucket'], name='recipebucket_band_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:48
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+# Копия логики recipes.ingredients на момент миграции: миграция не
+# должна зависеть от кода, который может измениться позже.
+MAX_AMOUNT = 32767
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[.\s]+', ' ', text.lower()).replace(
+        'ё', 'е').split())
+
+
+def merge_group(IngredientRecipe, canonical, duplicates):
+    """Переносит строки рецептов с дублей на canonical.
+
+    Рецепты, где ингредиент группы встречается несколько раз, сводятся
+    к одной строке с суммой количеств, остальные строки переносятся
+    одним UPDATE. Возвращает id затронутых рецептов.
+    """
+    rows = IngredientRecipe.objects.filter(
+        ingredient_id__in=[canonical, *duplicates]).order_by()
+    recipe_ids = set(rows.filter(
+        ingredient_id__in=duplicates).values_list('recipe_id', flat=True))
+    conflicts = list(rows.values('recipe_id').annotate(
+        rows=Count('id'), keep=Min('id'), total=Sum('amount'),
+    ).filter(rows__gt=1))
+    if conflicts:
+        rows.filter(
+            recipe_id__in=[conflict['recipe_id'] for conflict in conflicts]
+        ).exclude(
+            id__in=[conflict['keep'] for conflict in conflicts]
+        ).delete()
+        IngredientRecipe.objects.bulk_update(
+            [
+                IngredientRecipe(
+                    id=conflict['keep'], ingredient_id=canonical,
+                    amount=min(conflict['total'], MAX_AMOUNT))
+                for conflict in conflicts
+            ],
+            ('ingredient', 'amount'),
+            batch_size=500,
+        )
+    rows.filter(ingredient_id__in=duplicates).update(ingredient_id=canonical)
+    return recipe_ids
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeSignature = apps.get_model('recipes', 'RecipeSignature')
+    groups = {}
+    for ingredient_id, name, unit in Ingredient.objects.order_by(
+            'id').values_list('id', 'name', 'measurement_unit').iterator():
+        groups.setdefault(
+            (normalize(unit), normalize(name)), []).append(ingredient_id)
+    recipe_ids = set()
+    duplicate_ids = []
+    for canonical, *duplicates in groups.values():
+        if duplicates:
+            recipe_ids |= merge_group(IngredientRecipe, canonical, duplicates)
+            duplicate_ids.extend(duplicates)
+    Ingredient.objects.filter(id__in=duplicate_ids).delete()
+    Recipe.objects.filter(id__in=recipe_ids).update(snapshot={})
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0023_shoppingcart_servings'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_name_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+def log_existing_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientChange = apps.get_model('recipes', 'IngredientChange')
+    IngredientChange.objects.bulk_create(
+        (
+            IngredientChange(
+                ingredient_id=ingredient_id,
+                name=name,
+                measurement_unit=measurement_unit,
+            )
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.order_by('id').values_list(
+                    'id', 'name', 'measurement_unit').iterator())
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_ingredient_unique_name_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient_id', models.BigIntegerField(verbose_name='Ингредиент')),
+                ('name', models.CharField(max_length=200, verbose_name='Название')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='Единица измерения')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удалён')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Изменение ингредиента',
+                'verbose_name_plural': 'Изменения ингредиентов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunPython(
+            log_existing_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+import hashlib
+
+from django.db import migrations
+
+# Раскладка подписи на момент миграции: 64 значения uint32 little-endian,
+# 16 полос по 4 значения.
+BANDS = 16
+BAND_SIZE = 4 * 4
+BATCH_SIZE = 1000
+
+
+def get_buckets(minhash):
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                minhash[band * BAND_SIZE:(band + 1) * BAND_SIZE],
+                digest_size=7).digest(),
+            'little')
+        for band in range(BANDS)
+    ]
+
+
+def rebuild_buckets(apps, schema_editor):
+    """Пересчитывает корзины LSH из сохранённых подписей под 16 полос."""
+    RecipeSignature = apps.get_model('recipes', 'RecipeSignature')
+    RecipeBucket = apps.get_model('recipes', 'RecipeBucket')
+    RecipeBucket.objects.all().delete()
+    buckets = []
+    for recipe_id, minhash in RecipeSignature.objects.values_list(
+            'recipe_id', 'minhash').iterator(chunk_size=BATCH_SIZE):
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(get_buckets(bytes(minhash)))
+        )
+        if len(buckets) >= BATCH_SIZE * BANDS:
+            RecipeBucket.objects.bulk_create(buckets)
+            buckets = []
+    RecipeBucket.objects.bulk_create(buckets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_ingredientchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[.\s]+', ' ', text.lower()).replace(
+        'ё', 'е').split())
+
+
+def fill_normalized(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    batch = []
+    for ingredient in Ingredient.objects.only(
+            'id', 'name', 'measurement_unit').iterator(chunk_size=BATCH_SIZE):
+        ingredient.normalized_name = normalize(ingredient.name)
+        ingredient.normalized_unit = normalize(ingredient.measurement_unit)
+        batch.append(ingredient)
+        if len(batch) == BATCH_SIZE:
+            Ingredient.objects.bulk_update(
+                batch, ('normalized_name', 'normalized_unit'))
+            batch = []
+    Ingredient.objects.bulk_update(
+        batch, ('normalized_name', 'normalized_unit'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0026_rebuild_similarity_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=400, verbose_name='Название для сравнения'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_unit',
+            field=models.CharField(default='', editable=False, max_length=400, verbose_name='Единица для сравнения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_normalized, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='unique_name_measurement_unit',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('normalized_name', 'normalized_unit'), name='unique_normalized_ingredient'),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import UniqueConstraint
 
+from .ingredients import normalize
+
 User = get_user_model()
 
 
@@ -12,6 +15,7 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Подписчик',
         related_name='follower',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -71,21 +75,70 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name='Еденицы измерения'
     )
+    normalized_name = models.CharField(
+        max_length=400,
+        verbose_name='Название для сравнения',
+        editable=False,
+    )
+    normalized_unit = models.CharField(
+        max_length=400,
+        verbose_name='Единица для сравнения',
+        editable=False,
+    )
 
     class Meta():
         verbose_name = 'Ингридиенты'
         verbose_name_plural = 'Ингридиенты'
+        constraints = (
+            UniqueConstraint(
+                fields=('normalized_name', 'normalized_unit'),
+                name='unique_normalized_ingredient',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
+    def set_normalized(self):
+        """Ключ дубля: регистр, ё, точки и пробелы не важны.
+
+        save() вызывает его сам, для bulk_create его нужно вызвать явно.
+        """
+        self.normalized_name = normalize(self.name)
+        self.normalized_unit = normalize(self.measurement_unit)
+
+    def save(self, *args, **kwargs):
+        self.set_normalized()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {
+                'name', 'measurement_unit'} & set(update_fields):
+            kwargs['update_fields'] = {
+                *update_fields, 'normalized_name', 'normalized_unit'}
+        super().save(*args, **kwargs)
+
+    def validate_unique(self, exclude=None):
+        # Django 3.2 не проверяет UniqueConstraint в формах, без этого
+        # сохранение дубля из админки упало бы с IntegrityError.
+        super().validate_unique(exclude)
+        if exclude and {'name', 'measurement_unit'} & set(exclude):
+            return
+        self.set_normalized()
+        if Ingredient.objects.filter(
+            normalized_name=self.normalized_name,
+            normalized_unit=self.normalized_unit,
+        ).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': (
+                'Ингредиент с таким названием и единицей измерения '
+                'уже есть.')})
+
 
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
         verbose_name='Автор рецепта',
         on_delete=models.CASCADE,
-        related_name='recipes'
+        related_name='recipes',
+        db_index=False,
     )
     name = models.CharField(
         verbose_name='Название рецепта',
@@ -115,11 +168,24 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    snapshot = models.JSONField(
+        verbose_name='Снимок для чтения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -135,7 +201,8 @@ class IngredientRecipe(models.Model):
         Recipe,
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
-        related_name='ingredienttorecipe'
+        related_name='ingredienttorecipe',
+        db_index=False,
     )
     amount = models.PositiveSmallIntegerField(
         validators=[MinValueValidator(1)],
@@ -152,6 +219,12 @@ class IngredientRecipe(models.Model):
                 name='unique_ingredient_recipe'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient', 'amount'),
+                name='ingredientrecipe_recipe_idx',
+            ),
+        )
 
     def __str__(self):
         return f'Ингредиенты для рецепта {self.recipe}'
@@ -161,6 +234,7 @@ class Favorite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -190,7 +264,13 @@ class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='shopping_list'
+        related_name='shopping_list',
+        db_index=False,
+    )
+    servings = models.PositiveSmallIntegerField(
+        verbose_name='Порций',
+        default=1,
+        validators=[MinValueValidator(1)],
     )
 
     class Meta:
@@ -202,3 +282,55 @@ class ShoppingCart(models.Model):
                 name='unique_shoppingcart',
             ),
         )
+
+
+class RecipeSignature(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт',
+    )
+    minhash = models.BinaryField(verbose_name='MinHash-подпись')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+
+class RecipeBucket(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+        verbose_name='Рецепт',
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса LSH')
+    bucket = models.BigIntegerField(verbose_name='Корзина LSH')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = (
+            models.Index(
+                fields=('band', 'bucket'), name='recipebucket_band_idx'),
+        )
+
+
+class IngredientChange(models.Model):
+    """Журнал изменений справочника ингредиентов для синхронизации.
+
+    Номер последней записи служит версией справочника.
+    """
+    ingredient_id = models.BigIntegerField(verbose_name='Ингредиент')
+    name = models.CharField(verbose_name='Название', max_length=200)
+    measurement_unit = models.CharField(
+        verbose_name='Единица измерения', max_length=200)
+    deleted = models.BooleanField(verbose_name='Удалён', default=False)
+    created = models.DateTimeField(verbose_name='Дата', auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение ингредиента'
+        verbose_name_plural = 'Изменения ингредиентов'
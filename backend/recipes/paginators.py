@@ -0,0 +1,28 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator для changelist админки на больших таблицах.
+
+    Для запросов без фильтров на PostgreSQL число строк берётся из
+    статистики pg_class, если оно больше exact_count_limit, вместо
+    полного COUNT(*). Для остальных запросов считается точно.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.exact_count_limit:
+                return int(row[0])
+        return super().count
@@ -0,0 +1,133 @@
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import IngredientRecipe, Recipe, RecipeBucket, RecipeSignature
+
+NUM_PERM = 64
+# Рецепт становится кандидатом с вероятностью 1 - (1 - s^ROWS)^BANDS, где
+# s - сходство Жаккара. Порог, где она круто растёт, около
+# (1 / BANDS)^(1 / ROWS) = 0.5: при s = 0.3 это 12%, при s = 0.7 - 98%.
+# После смены BANDS корзины нужно пересчитать: миграцией по сохранённым
+# подписям или командой build_similarity_index.
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PRIME = (1 << 31) - 1
+SIMILAR_CANDIDATES = 500
+
+
+@lru_cache(maxsize=None)
+def get_hash_params():
+    """Коэффициенты хэш-функций MinHash.
+
+    numpy импортируется при первом обращении, а не при старте воркера.
+    """
+    import numpy as np
+
+    state = np.random.RandomState(20230719)
+    return (
+        state.randint(1, PRIME, size=NUM_PERM).astype(np.uint64),
+        state.randint(0, PRIME, size=NUM_PERM).astype(np.uint64),
+    )
+
+
+def get_features(recipe_ids):
+    """Множества признаков рецептов: ингредиенты и теги.
+
+    Ингредиенты кодируются чётными числами, теги - нечётными, чтобы
+    одинаковые id не совпадали.
+    """
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        features[recipe_id].add(ingredient_id * 2)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag_id'):
+        features[recipe_id].add(tag_id * 2 + 1)
+    return features
+
+
+def get_minhash(features):
+    import numpy as np
+
+    hash_a, hash_b = get_hash_params()
+    values = np.fromiter(features, dtype=np.uint64, count=len(features))
+    values %= PRIME
+    hashes = (hash_a[:, None] * values[None, :] + hash_b[:, None]) % PRIME
+    return hashes.min(axis=1).astype('<u4')
+
+
+def get_buckets(minhash):
+    return [
+        int.from_bytes(
+            hashlib.blake2b(band.tobytes(), digest_size=7).digest(),
+            'little')
+        for band in minhash.reshape(BANDS, ROWS)
+    ]
+
+
+def load_minhash(data):
+    import numpy as np
+
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+@transaction.atomic
+def update_signatures(recipe_ids):
+    """Пересчитывает подписи и корзины LSH для рецептов."""
+    recipe_ids = list(recipe_ids)
+    features = get_features(recipe_ids)
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    signatures = []
+    buckets = []
+    for recipe_id in recipe_ids:
+        if not features[recipe_id]:
+            continue
+        minhash = get_minhash(features[recipe_id])
+        signatures.append(RecipeSignature(
+            recipe_id=recipe_id, minhash=minhash.tobytes()))
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(get_buckets(minhash))
+        )
+    RecipeSignature.objects.bulk_create(signatures)
+    RecipeBucket.objects.bulk_create(buckets)
+
+
+def find_similar(recipe_id, limit=10):
+    """Возвращает id похожих рецептов, от самого похожего.
+
+    Кандидаты - рецепты, совпавшие с исходным хотя бы в одной полосе LSH;
+    они ранжируются по оценке сходства Жаккара из MinHash-подписей.
+    """
+    try:
+        signature = load_minhash(
+            RecipeSignature.objects.get(recipe_id=recipe_id).minhash)
+    except RecipeSignature.DoesNotExist:
+        return []
+    query = Q()
+    for band, bucket in enumerate(get_buckets(signature)):
+        query |= Q(band=band, bucket=bucket)
+    candidates = RecipeBucket.objects.filter(query).exclude(
+        recipe_id=recipe_id
+    ).values('recipe_id').annotate(
+        bands=Count('id')
+    ).order_by('-bands').values_list('recipe_id', flat=True)[
+        :SIMILAR_CANDIDATES]
+    rows = list(RecipeSignature.objects.filter(
+        recipe_id__in=list(candidates)).values_list('recipe_id', 'minhash'))
+    if not rows:
+        return []
+    import numpy as np
+
+    ids = np.array([recipe_id for recipe_id, _ in rows])
+    matrix = np.vstack([load_minhash(minhash) for _, minhash in rows])
+    scores = (matrix == signature).mean(axis=1)
+    order = np.lexsort((ids, -scores))[:limit]
+    return ids[order].tolist()
@@ -0,0 +1,91 @@
+"""Снимки тел рецептов для выдачи API.
+
+Снимки обновляют и api, и админка, поэтому сборка живёт в приложении
+recipes.
+"""
+from collections import defaultdict
+
+from rest_framework.fields import DateTimeField
+
+from .models import IngredientRecipe, Recipe
+
+SNAPSHOT_BATCH_SIZE = 500
+
+pub_date_field = DateTimeField()
+image_storage = Recipe._meta.get_field('image').storage
+
+
+def build_recipe_bodies(recipe_ids):
+    """Собирает тела рецептов без полей ModelSerializer.
+
+    Результат совпадает с RecipeBodySerializer байт в байт: те же ключи
+    в том же порядке, сортировка тегов по имени и ингредиентов по -id.
+    """
+    rows = Recipe.objects.filter(id__in=recipe_ids).values(
+        'id', 'name', 'image', 'text', 'cooking_time', 'pub_date',
+        'author_id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    tags = defaultdict(list)
+    for row in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ).order_by('tag__name'):
+        tags[row['recipe_id']].append({
+            'id': row['tag_id'],
+            'name': row['tag__name'],
+            'color': row['tag__color'],
+            'slug': row['tag__slug'],
+        })
+    ingredients = defaultdict(list)
+    for row in IngredientRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ).order_by('-id'):
+        ingredients[row['recipe_id']].append({
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        })
+    return {
+        row['id']: {
+            'id': row['id'],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': False,
+            },
+            'tags': tags[row['id']],
+            'ingredients': ingredients[row['id']],
+            'image': image_storage.url(row['image']) if row['image'] else None,
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': row['name'],
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'pub_date': pub_date_field.to_representation(row['pub_date']),
+        }
+        for row in rows
+    }
+
+
+def refresh_snapshots(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    bodies = {}
+    for start in range(0, len(recipe_ids), SNAPSHOT_BATCH_SIZE):
+        batch = build_recipe_bodies(
+            recipe_ids[start:start + SNAPSHOT_BATCH_SIZE])
+        Recipe.objects.bulk_update(
+            [Recipe(id=recipe_id, snapshot=body)
+             for recipe_id, body in batch.items()],
+            ['snapshot'],
+        )
+        bodies.update(batch)
+    return bodies
@@ -0,0 +1,94 @@
+import threading
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from api.validators import is_unique_violation
+from .models import Favorite, Ingredient, Recipe
+
+User = get_user_model()
+
+ALREADY_IN_FAVORITES = 'Рецепт уже добавлен в избранное.'
+
+
+def create_recipe(author):
+    return Recipe.objects.create(
+        author=author, name='Суп', text='Сварить', cooking_time=10,
+        image='recipes/image/soup.png')
+
+
+class FavoriteUniqueTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Иван', last_name='Иванов', password='pass12345X')
+        self.recipe = create_recipe(self.user)
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.id}/favorite/'
+
+    def test_duplicate_insert_returns_400(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {'non_field_errors': [ALREADY_IN_FAVORITES]})
+        self.assertEqual(Favorite.objects.count(), 1)
+
+    def test_other_unique_violation_is_not_reported(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        with self.assertRaises(IntegrityError) as context:
+            with transaction.atomic():
+                Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertTrue(is_unique_violation(
+            context.exception, Ingredient, 'unique_normalized_ingredient'))
+        self.assertFalse(is_unique_violation(
+            context.exception, Favorite, 'unique_favorites'))
+
+
+class IngredientValidationTests(TestCase):
+
+    def test_normalized_duplicate_is_rejected(self):
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        ingredient.full_clean()
+        with self.assertRaises(ValidationError) as context:
+            Ingredient(name='соль.', measurement_unit='Г').full_clean()
+        self.assertIn('name', context.exception.message_dict)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Нужны параллельные транзакции PostgreSQL')
+class FavoriteRaceTests(APITransactionTestCase):
+
+    def test_concurrent_inserts_create_one_favorite(self):
+        user = User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Иван', last_name='Иванов', password='pass12345X')
+        recipe = create_recipe(user)
+        barrier = threading.Barrier(2)
+        responses = []
+
+        def add_favorite():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                responses.append(
+                    client.post(f'/api/recipes/{recipe.id}/favorite/'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add_favorite) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            sorted(response.status_code for response in responses),
+            [201, 400])
+        self.assertEqual(Favorite.objects.count(), 1)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from recipes.paginators import ApproximateCountPaginator
+
 User = get_user_model()
 
 
@@ -8,6 +10,8 @@ User = get_user_model()
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name')
     search_fields = ('username', 'email')
-    list_filter = ('email', 'first_name')
+    list_filter = ('is_active', 'is_staff')
     ordering = ('username', )
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'